@@ -1,97 +1,170 @@
-from heapq import heappush, heappop
-from typing import Optional, List
+from __future__ import annotations
 
-import itertools
+import time
+from collections import deque
+from multiprocessing import Pool, Value
+from typing import Optional, List, Tuple, Callable
 
+from Astar_OD_ID.Astar_OD.Frontier import FrontierType
 from Astar_OD_ID.Astar_OD.ODProblem import ODProblem
 from Astar_OD_ID.Astar_OD.ODSolver import ODSolver
 from src.util.CAT import CAT
 from src.util.agent_path import AgentPath
+from src.util.assignments import KBestAssignments
+from src.util.budget import Budget, BudgetTracker, Status
 from src.util.coord import Coord
-from src.util.grid import Grid, HeuristicType
+from src.util.grid import Grid, HeuristicType, UNREACHABLE
 from src.util.group import Group
 from src.util.groups import Groups
 from src.util.logger.logger import Logger
 from src.util.path_set import PathSet
+from src.util.search_stats import SearchStats
+from src.util.team_heuristic import TeamHeuristic
 
 logger = Logger("IDProblem")
 
+# The state of a worker process of the parallel exhaustive matching
+worker_problem = None
+worker_cat = None
+worker_best = None
 
-class Matching:
 
-    def __init__(self, goals, cost):
-        """
-        Create a matching object for sorting in priority queue.
-        :param goals: The goal assignment
-        :param cost: The cost, used for sorting
-        """
-        self.goals = goals
-        self.cost = cost
+def init_worker(problem: IDProblem, cat: Optional[CAT], best):
+    """
+    Initializes a worker process used for the parallel exhaustive matching.
+    :param problem: The problem, without its goal assignments
+    :param cat: The optional Collision Avoidance table to use for all paths
+    :param best: The shared cost of the best solution found so far
+    """
+    global worker_problem, worker_cat, worker_best
+    worker_problem = problem
+    worker_cat = cat
+    worker_best = best
 
-    def __lt__(self, other):
-        """
-        Compares the costs
-        :param other: The other Matching
-        :return: If this one is smaller
-        """
-        return self.cost < other.cost
+
+def solve_assignment(goals: Tuple[int, ...]) \
+        -> Tuple[Optional[List[AgentPath]], Optional[Status], SearchStats]:
+    """
+    Solves a single goal assignment in a worker process.
+    The assignment is skipped or cancelled once its lower bound can no longer beat the best solution found so far.
+    :param goals: The assigned goals
+    :return: A solution that is cheaper than the best solution at the time it was found, otherwise None,
+             the status when a budget was exceeded and the statistics of the assignment
+    """
+    stats = worker_problem.stats = SearchStats()
+    lower_bound = worker_problem.get_initial_heuristic(goals)
+    if lower_bound >= worker_best.value:
+        stats.matchings_pruned += 1
+        return None, None, stats
+    stats.matchings_tried += 1
+    worker_problem.cancelled = lambda: worker_best.value <= lower_bound
+    worker_problem.status = None
+    solution = worker_problem.solve_matching(worker_cat, worker_best.value,
+                                             dict(zip(worker_problem.agent_ids, goals)))
+    if solution is None:
+        return None, worker_problem.status, stats
+    cost = sum(map(lambda x: x.get_cost(), solution))
+    with worker_best.get_lock():
+        if cost >= worker_best.value:
+            return None, None, stats
+        worker_best.value = cost
+    return solution, None, stats
 
 
 class IDProblem:
 
-    def __init__(self, grid: Grid, heuristic_type: HeuristicType, group: Group, enable_sorting=False, pq_size=100):
+    def __init__(self, grid: Grid, heuristic_type: HeuristicType, group: Group,
+                 frontier_type: FrontierType = FrontierType.Heap, enable_epea=False, workers=1,
+                 enable_team_heuristic=False, tracker: Optional[BudgetTracker] = None,
+                 search_budget: Optional[Budget] = None, enable_anytime=False,
+                 improved: Optional[Callable[[List[AgentPath], int], None]] = None, enable_assignments=True):
         """
         Create an A*+ID+OD problem.
         :param grid: The grid of the problem.
         :param heuristic_type: The type of heuristic to use.
         :param group: The subgroup of agents to solve the problem for.
+        :param frontier_type: The frontier implementation used by the A*+OD solvers.
+        :param enable_epea: Use Enhanced Partial Expansion in the A*+OD solvers.
+        :param workers: The number of processes used to try goal assignments in parallel with exhaustive matching.
+                Processes of a multiprocessing pool can't create their own, so use 1 when running inside one.
+        :param enable_team_heuristic: Use the cost of the cheapest assignment of each team to distinct goals as
+                heuristic in the A*+OD solvers, only used with heuristic matching.
+        :param tracker: Optional budget of the whole solve, shared with the enclosing calls.
+                Worker processes each count their own expansions.
+        :param search_budget: Optional limits of every A*+OD search.
+        :param enable_anytime: Return the best solution found so far instead of None once a limit is exceeded,
+                only exhaustive matching finds solutions before it is done.
+        :param improved: Optional callback that is called with every improved solution of the exhaustive matching
+                and the lower bound on the cost proven so far.
+        :param enable_assignments: Enumerate the goal assignments of exhaustive matching. Disabled for the problems of
+                the worker processes, which are handed their assignments.
         """
         self.grid = grid
-        self.assigned_goals = None
+        self.frontier_type = frontier_type
+        self.enable_epea = enable_epea
+        self.enable_team_heuristic = enable_team_heuristic
+        self.tracker = tracker
+        self.search_budget = search_budget
+        self.enable_anytime = enable_anytime
+        self.improved = improved
+
+        # The result of the last solve, while solving only set once a limit is exceeded
+        self.status: Optional[Status] = None
+
+        # The lower bound on the cost of the group proven by the last solve,
+        # exhaustive matching raises it while solving, otherwise it is only known once solved
+        self.lower_bound = 0
+        self.team_heuristic = None
+        if enable_team_heuristic and heuristic_type == HeuristicType.Heuristic:
+            self.team_heuristic = TeamHeuristic(grid)
+        self.workers = workers
+        self.cancelled = None
+        self.assignments = None
+
+        # The initial heuristic of the last returned goal assignment, or the maximum once there are none left
+        self.goal_bound = 0
+
+        # The statistics of all solves of this problem
+        self.stats = SearchStats()
+
+        # The results of the A*+OD searches, shared by all goal assignments
+        self.solutions = dict()
         self.heuristic_type = heuristic_type
         self.agent_ids = group.agent_ids
-        self.enable_sorting = enable_sorting
-
-        # Generate iterator with all possible matchings
-        if heuristic_type == HeuristicType.Exhaustive:
-            self.pq_size = pq_size
-            goal_ids = []
-            for agent_id in self.agent_ids:
-                start = self.grid.starts[agent_id]
-                ids = []
-                for i, goal in enumerate(self.grid.goals):
-                    if start.color == goal.color:
-                        ids.append(i)
-                ids.sort(key=lambda x: self.grid.get_heuristic(Coord(start.x, start.y), x))
-                goal_ids.append(ids)
-            self.assigned_goals = filter(lambda x: len(x) == len(set(x)), itertools.product(*goal_ids))
-            if enable_sorting:
-                self.goal_pq = []
+
+        # Enumerate the possible matchings in order of their initial heuristic,
+        # an agent can only be assigned a goal of its own color.
+        # Distances are symmetric, so the costs are measured from the starts of the group,
+        # instead of computing the table of every goal.
+        if heuristic_type == HeuristicType.Exhaustive and enable_assignments:
+            start_time = time.perf_counter()
+            starts = [self.grid.starts[agent_id] for agent_id in self.agent_ids]
+            distances = self.grid.compute_distances([[self.grid.get_cell(start)] for start in starts])
+            costs = []
+            colors = []
+            for start, table in zip(starts, distances):
+                costs.append([int(table[goal.y, goal.x]) if start.color == goal.color
+                              and table[goal.y, goal.x] != UNREACHABLE else None for goal in self.grid.goals])
+                colors.append(start.color)
+            self.assignments = KBestAssignments(costs, colors)
+            self.stats.add_time("assignments", time.perf_counter() - start_time)
 
     def get_next_goal(self, maximum):
         """
-        Gets the next set of goal assignments.
-        Either from the iterator when sorting is disable or from the heap if it is enabled.
-        :param maximum: The maximum cost used for pruning when sorting is enabled
+        Gets the next set of goal assignments, in non-decreasing order of their initial heuristic.
+        :param maximum: The maximum cost, once the initial heuristic reaches it no more assignments are returned
         :return: The next goal assignment or None
         """
-        if not self.enable_sorting:
-            return next(self.assigned_goals, None)
-        while len(self.goal_pq) < self.pq_size:
-            next_push = next(self.assigned_goals, None)
-            if next_push is None:
-                break
-            heuristic = self.get_initial_heuristic(next_push)
-            if heuristic < maximum:
-                heappush(self.goal_pq, Matching(next_push, heuristic))
-        if len(self.goal_pq) == 0:
+        start_time = time.perf_counter()
+        pruned = self.assignments.pruned
+        assignment = self.assignments.next(maximum - len(self.agent_ids))
+        self.stats.matchings_pruned += self.assignments.pruned - pruned
+        self.stats.add_time("assignments", time.perf_counter() - start_time)
+        if assignment is None:
+            self.goal_bound = maximum
             return None
-        next_goal = heappop(self.goal_pq)
-        if next_goal.cost >= maximum:
-            self.goal_pq = []
-            return self.get_next_goal(maximum)
-        else:
-            return next_goal.goals
+        self.goal_bound = assignment[0] + len(self.agent_ids)
+        return assignment[1]
 
     def get_initial_heuristic(self, goals) -> int:
         """
@@ -110,24 +183,117 @@ class IDProblem:
         """
         Tries to solve the problem.
         :param cat: An optional Collision Avoidance table to use for all paths.
-        :return: A list of paths for the given agents if a solution exists otherwise None
+        :return: A list of paths for the given agents if a solution exists otherwise None,
+                 the status tells if a limit of the budget was exceeded.
+                 With anytime enabled the best solution found before the limit was exceeded is returned.
         """
+        self.status = None
+        self.lower_bound = 0
         if self.heuristic_type == HeuristicType.Heuristic:
-            return self.solve_matching(cat)
+            solution = self.solve_matching(cat)
+        elif self.workers > 1:
+            solution = self.solve_parallel(cat)
         else:
-            best = float("inf")
-            best_solution = None
+            solution = self.solve_exhaustive(cat)
+        if self.status is not None:
+            return solution if self.enable_anytime else None
+        if solution is None:
+            self.status = Status.NoSolution
+        else:
+            self.status = Status.Solved
+            self.lower_bound = sum(map(lambda x: x.get_cost(), solution))
+        return solution
+
+    def solve_exhaustive(self, cat=None) -> Optional[List[AgentPath]]:
+        """
+        Tries all goal assignments one after another.
+        The assignments are tried in order of their initial heuristic, so every solution of an earlier assignment
+        that is not improved upon is optimal up to the initial heuristic of the next one.
+        :param cat: An optional Collision Avoidance table to use for all paths.
+        :return: A list of paths for the given agents if a solution exists otherwise None,
+                 the best solution so far when a limit is exceeded
+        """
+        best = float("inf")
+        best_solution = None
+        goals = self.get_next_goal(best)
+        self.lower_bound = self.goal_bound
+        while goals is not None:
+            # The searches check the tracker as well, but assignments answered by earlier searches start none
+            if self.tracker is not None:
+                self.status = self.tracker.check()
+                if self.status is not None:
+                    return best_solution
+            logger.log(f"Trying goal assignment of {goals} with maximum cost of {best}")
+            self.stats.matchings_tried += 1
+            solution = self.solve_matching(cat, best, dict(zip(self.agent_ids, goals)))
+            if self.status is not None:
+                return best_solution
+            improved = False
+            if solution is not None:
+                cost = sum(map(lambda x: x.get_cost(), solution))
+                if cost < best:
+                    best = cost
+                    best_solution = solution
+                    improved = True
             goals = self.get_next_goal(best)
-            while goals is not None:
-                logger.log(f"Trying goal assignment of {goals} with maximum cost of {best}")
-                solution = self.solve_matching(cat, best, dict(zip(self.agent_ids, goals)))
+            self.lower_bound = min(best, self.goal_bound)
+            if improved and self.improved is not None:
+                self.improved(best_solution, self.lower_bound)
+        return best_solution
+
+    def solve_parallel(self, cat=None) -> Optional[List[AgentPath]]:
+        """
+        Tries all goal assignments using a pool of worker processes.
+        The cost of the best solution is shared between the workers, so they prune with the tightest known bound and
+        cancel assignments that can no longer win.
+        The solution has the lowest cost, but when assignments tie it can be of a different assignment than when
+        they are tried one after another.
+        :param cat: An optional Collision Avoidance table to use for all paths.
+        :return: A list of paths for the given agents if a solution exists otherwise None,
+                 the best solution so far when a limit is exceeded
+        """
+        best = Value("d", float("inf"))
+        best_solution = None
+        best_cost = float("inf")
+
+        # The goal assignments are created in this process, so the workers don't need them
+        worker = IDProblem(self.grid, self.heuristic_type, Group(self.agent_ids), frontier_type=self.frontier_type,
+                           enable_epea=self.enable_epea, tracker=self.tracker, search_budget=self.search_budget,
+                           enable_assignments=False)
+
+        with Pool(self.workers, initializer=init_worker, initargs=(worker, cat, best)) as pool:
+            # Only a few assignments are handed out ahead, so the next ones are pruned with a recent bound
+            # Each with the initial heuristic of its assignment
+            pending = deque()
+            goals = self.get_next_goal(best.value)
+            self.lower_bound = self.goal_bound
+            while goals is not None or len(pending) > 0:
+                if self.tracker is not None:
+                    self.status = self.tracker.check()
+                    if self.status is not None:
+                        return best_solution
+                while goals is not None and len(pending) < 2 * self.workers:
+                    logger.log(f"Trying goal assignment of {goals} with maximum cost of {best.value}")
+                    pending.append((self.goal_bound, pool.apply_async(solve_assignment, (goals,))))
+                    goals = self.get_next_goal(best.value)
+                solution, status, stats = pending.popleft()[1].get()
+                self.stats.add(stats)
+                if status is not None:
+                    # Leaving the pool terminates the workers that are still busy
+                    self.status = status
+                    return best_solution
+                improved = False
                 if solution is not None:
                     cost = sum(map(lambda x: x.get_cost(), solution))
-                    if cost < best:
-                        best = cost
+                    if cost < best_cost:
+                        best_cost = cost
                         best_solution = solution
-                goals = self.get_next_goal(best)
-            return best_solution
+                        improved = True
+                # The assignments are handed out in order, so the oldest pending one has the lowest bound
+                self.lower_bound = min(best_cost, pending[0][0] if len(pending) > 0 else self.goal_bound)
+                if improved and self.improved is not None:
+                    self.improved(best_solution, self.lower_bound)
+        return best_solution
 
     def solve_matching(self, cat: Optional[CAT], maximum=float("inf"), assigned_goals: dict = None) -> Optional[
         List[AgentPath]]:
@@ -148,9 +314,8 @@ class IDProblem:
         # Create initial agent paths
         groups = Groups([Group([n]) for n in self.agent_ids])
         for group in groups:
-            problem = ODProblem(self.grid, group, cats, assigned_goals=assigned_goals)
-            solver = ODSolver(problem, max_cost=paths.get_remaining_cost(group.agent_ids, maximum))
-            group_paths = solver.solve()
+            group_paths = self.solve_group(group, cats, paths.get_remaining_cost(group.agent_ids, maximum),
+                                           assigned_goals)
             if group_paths is None:
                 return None
             # Update the path and CAT table
@@ -171,27 +336,26 @@ class IDProblem:
                 avoided_conflicts.add(combo)
 
                 # Try rerunning a while the b moves are not possible
-                problem = ODProblem(self.grid, a_group, cats,
-                                    illegal_moves=[paths[i] for i in b_group.agent_ids], assigned_goals=assigned_goals)
-
                 # The maximum cost that it can have while still being optimal
                 maximum_cost = paths[a].get_cost() + sum(paths[i].get_cost() for i in b_group.agent_ids)
-                solver = ODSolver(problem, max_cost=maximum_cost)
-                solution = solver.solve()
+                self.stats.replans += 1
+                solution = self.solve_group(a_group, cats, maximum_cost, assigned_goals,
+                                            illegal_moves=[paths[i] for i in b_group.agent_ids])
+                if self.status is not None:
+                    return None
                 if solution is not None:
                     # If a solution is found we can update the paths and we don't need to combine anything
                     combine_groups = False
                     paths.update(solution)
                 else:
                     # Try redoing b by making a illegal
-                    problem = ODProblem(self.grid, b_group, cats,
-                                        illegal_moves=[paths[i] for i in a_group.agent_ids],
-                                        assigned_goals=assigned_goals)
-
                     # The maximum cost that it can have while still being optimal
                     maximum_cost = paths[b].get_cost() + sum(paths[i].get_cost() for i in a_group.agent_ids)
-                    solver = ODSolver(problem, max_cost=maximum_cost)
-                    solution = solver.solve()
+                    self.stats.replans += 1
+                    solution = self.solve_group(b_group, cats, maximum_cost, assigned_goals,
+                                                illegal_moves=[paths[i] for i in a_group.agent_ids])
+                    if self.status is not None:
+                        return None
                     if solution is not None:
                         # If a solution is found we can update the paths and we don't need to combine anything
                         combine_groups = False
@@ -200,10 +364,10 @@ class IDProblem:
             # Combine groups
             if combine_groups:
                 group = groups.combine_agents(a, b)
+                self.stats.merges += 1
                 logger.log(f"Combining agents from groups of {a} and {b} into {group}")
-                problem = ODProblem(self.grid, group, cats, assigned_goals=assigned_goals)
-                solver = ODSolver(problem, max_cost=paths.get_remaining_cost(group.agent_ids, maximum))
-                group_paths = solver.solve()
+                group_paths = self.solve_group(group, cats, paths.get_remaining_cost(group.agent_ids, maximum),
+                                               assigned_goals)
                 if group_paths is None:
                     return None
                 paths.update(group_paths)
@@ -211,3 +375,48 @@ class IDProblem:
             # Find next conflict
             conflict = paths.find_conflict()
         return paths.paths
+
+    def solve_group(self, group: Group, cats: List[CAT], maximum_cost, assigned_goals: Optional[dict],
+                    illegal_moves: List[AgentPath] = None) -> Optional[List[AgentPath]]:
+        """
+        Solves a group with the A*+OD solver, reusing the results of earlier searches.
+        Goal assignments share most of their goals, so the same searches are repeated for many of them.
+        A search is the same when the group, the goals, the predetermined paths and the contents of the CATs are.
+        A found solution is optimal, so it answers every maximum cost,
+        a search without solution answers every maximum cost up to the one it was run with.
+        :param group: The group to solve
+        :param cats: The Collision Avoidance tables
+        :param maximum_cost: The maximum cost of the solution, including the predetermined paths
+        :param assigned_goals: The goals for each agent, None when heuristic matching is used
+        :param illegal_moves: Predetermined paths
+        :return: The paths of the group agents if a solution exists, otherwise None
+        """
+        ids = group.agent_ids if illegal_moves is None else \
+            tuple(path.agent_id for path in illegal_moves) + group.agent_ids
+        key = (ids,
+               None if assigned_goals is None else tuple(assigned_goals[agent_id] for agent_id in ids),
+               None if illegal_moves is None else tuple(path.coords for path in illegal_moves),
+               tuple(cat.get_digest(group.agent_ids) for cat in cats))
+        cached = self.solutions.get(key)
+        if cached is not None:
+            solution, cost = cached
+            if solution is not None or maximum_cost <= cost:
+                self.stats.cached += 1
+                return solution if solution is not None and cost <= maximum_cost else None
+
+        problem = ODProblem(self.grid, group, cats, illegal_moves=illegal_moves, assigned_goals=assigned_goals,
+                            team_heuristic=self.team_heuristic)
+        tracker = self.tracker if self.search_budget is None else self.search_budget.start(self.tracker)
+        solver = ODSolver(problem, max_cost=maximum_cost, frontier_type=self.frontier_type,
+                          enable_epea=self.enable_epea, cancelled=self.cancelled, tracker=tracker)
+        solution = solver.solve()
+        self.stats.add(solver.stats)
+        self.stats.largest_group = max(self.stats.largest_group, len(group.agent_ids))
+        if solver.status == Status.Solved:
+            self.solutions[key] = (solution, problem.predetermined_cost + sum(path.get_cost() for path in solution))
+        elif solver.status == Status.NoSolution:
+            self.solutions[key] = (None, maximum_cost)
+        elif solver.status != Status.Cancelled:
+            # A stopped search says nothing about the existence of a solution, so the solve stops as well
+            self.status = solver.status
+        return solution
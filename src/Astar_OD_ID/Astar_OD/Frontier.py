@@ -0,0 +1,79 @@
+from enum import Enum
+from heapq import heappush, heappop
+
+
+class FrontierType(Enum):
+    Heap = 1
+    Bucket = 2
+
+
+class HeapFrontier:
+
+    def __init__(self):
+        """
+        Create a frontier that sorts the nodes with a binary heap.
+        The order is decided by the comparison of the nodes.
+        """
+        self.heap = []
+
+    def push(self, node):
+        """
+        Adds a node to the frontier.
+        :param node: The node
+        """
+        heappush(self.heap, node)
+
+    def pop(self):
+        """
+        Removes the best node from the frontier.
+        :return: The node
+        """
+        return heappop(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class BucketFrontier:
+
+    def __init__(self):
+        """
+        Create a frontier that groups nodes in buckets of equal cost + heuristic, conflicts and heuristic.
+        Nodes in the same bucket are returned last in first out.
+        As costs are integers there are only few distinct buckets,
+        so the keys are kept in a heap while the nodes themselves are never compared.
+        """
+        self.buckets = dict()
+        self.keys = []
+        self.size = 0
+
+    def push(self, node):
+        """
+        Adds a node to the frontier.
+        :param node: The node
+        """
+        key = (node.cost + node.heuristic, node.conflicts, node.heuristic)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = [node]
+            heappush(self.keys, key)
+        else:
+            bucket.append(node)
+        self.size += 1
+
+    def pop(self):
+        """
+        Removes the best node from the frontier.
+        :return: The node
+        """
+        key = self.keys[0]
+        bucket = self.buckets[key]
+        node = bucket.pop()
+        if len(bucket) == 0:
+            del self.buckets[key]
+            heappop(self.keys)
+        self.size -= 1
+        return node
+
+    def __len__(self):
+        return self.size
@@ -1,18 +1,19 @@
-from typing import Tuple, Iterable, List
+from typing import Tuple, Iterable, List, Optional
 
 from Astar_OD_ID.Astar_OD.ODState import ODState
 from src.util.CAT import CAT
-from src.util.agent import Agent
 from src.util.agent_path import AgentPath
 from src.util.coord import Coord
 from src.util.grid import Grid
 from src.util.group import Group
+from src.util.reservation_table import ReservationTable
+from src.util.team_heuristic import TeamHeuristic
 
 
 class ODProblem:
 
     def __init__(self, grid: Grid, group: Group, cats: List[CAT], illegal_moves: List[AgentPath] = None,
-                 assigned_goals: dict = None):
+                 assigned_goals: dict = None, team_heuristic: Optional[TeamHeuristic] = None):
         """
         Creates a problem to be solved by the A*+OD solver
         :param grid: The grid with walls as well as the starting positions and end positions
@@ -20,23 +21,47 @@ class ODProblem:
         :param cats: The CAT tables to tiebreak on amount of conflicts caused
         :param illegal_moves: Predetermined paths
         :param assigned_goals: The goals for each agent
+        :param team_heuristic: Optional lower bound on the cost of each team, used instead of the distance to the
+                nearest goal of the agents of the group. Has no effect when goals are assigned.
         """
         self.grid = grid
         self.agent_ids = group.agent_ids
         self.assigned_goals = assigned_goals
 
-        # The starting agents are the predetermined agents followed by the starting positions of each agent
-        agents = []
-        if illegal_moves is not None:
-            for moves in illegal_moves:
-                agents.append(Agent(moves.agent_id, moves[0], moves.color))
-        for id in self.agent_ids:
-            start = grid.starts[id]
-            agents.append(Agent(id, Coord(start.x, start.y), start.color))
-
-        # Create the initial state and add the predetermined moves for the next time_step
-        self.initial = ODState(agents, illegal_moves_set=illegal_moves, time_step=0)
-        self.illegal_moves = illegal_moves
+        # States only store the cells of the agents, so the ids and colors are kept here in the same order.
+        self.ids = tuple(self.agent_ids)
+        self.colors = tuple(grid.starts[id].color for id in self.ids)
+        positions = [grid.get_cell(Coord(grid.starts[id].x, grid.starts[id].y)) for id in self.ids]
+
+        # The heuristic table used by each agent
+        if assigned_goals is None:
+            self.heuristic_indexes = self.colors
+        else:
+            self.heuristic_indexes = tuple(assigned_goals[id] for id in self.ids)
+        self.heuristics = [grid.heuristics[index] for index in self.heuristic_indexes]
+
+        # The indexes of the agents of each team, when the team heuristic is used
+        self.team_heuristic = team_heuristic if assigned_goals is None else None
+        self.teams = dict()
+        if self.team_heuristic is not None:
+            for index, color in enumerate(self.colors):
+                self.teams.setdefault(color, []).append(index)
+
+        # The predetermined agents are not part of the states, the moves of the group agents are checked against
+        # their reservations instead. Their paths are fixed, so their cost is known in advance.
+        self.reservations = None
+        self.predetermined_cost = 0
+        if illegal_moves:
+            self.reservations = ReservationTable(grid, illegal_moves)
+            self.predetermined_cost = sum(path.get_cost() for path in illegal_moves)
+
+        goal_count = sum(grid.on_goal(cell, color) for cell, color in zip(positions, self.colors))
+        if self.team_heuristic is None:
+            heuristic = sum(table[cell] for cell, table in zip(positions, self.heuristics))
+        else:
+            heuristic = sum(self.team_heuristic.get(color, tuple(sorted(positions[i] for i in team)))
+                            for color, team in self.teams.items())
+        self.initial = ODState(positions, goal_count=goal_count, heuristic=heuristic)
         self.cats = cats
 
     def expand(self, parent: ODState, current_time) -> Iterable[Tuple[ODState, int, int]]:
@@ -47,72 +72,182 @@ class ODProblem:
         :return: A list of tuples consisting of the states, their added costs and the number of caused conflicts
         """
         res = []
-        agent, acc = parent.get_next()
+        index, cell, acc = parent.get_next()
         child_time = current_time + 1
-        for dx, dy in ((0, 1), (0, -1), (1, 0), (-1, 0)):
-            new_agent = agent.move(dx, dy)
-            if not self.grid.is_walkable(new_agent.coords):
-                continue
-            if not parent.valid_next(new_agent):
+        next_time, reservations = self.get_next_time(parent)
+        color = self.colors[index]
+        for new_cell in self.grid.successors[cell]:
+            if not parent.valid_next(new_cell) or \
+                    reservations is not None and not reservations.is_free(parent.time + 1, cell, new_cell):
                 continue
-            state, additional_cost = parent.move_with_agent(new_agent, 0, self.illegal_moves, child_time)
-            res.append((state, acc + 1 + additional_cost, self.get_cat(new_agent.coords, child_time)))
-        # Add standing still as option
-        if parent.valid_next(agent):
-            if self.grid.on_goal(agent):
-                state, additional_cost = parent.move_with_agent(agent, acc + 1, self.illegal_moves, child_time)
-                res.append((state, additional_cost, self.get_cat(agent.coords, child_time)))
+            on_goal = self.grid.on_goal(new_cell, color)
+            if new_cell != cell:
+                state = parent.move_with_agent(new_cell, 0, on_goal, self.get_heuristic_change(parent, index, new_cell),
+                                               next_time)
+                res.append((state, acc + 1, self.get_cat(new_cell, child_time)))
+            # Standing still, which is the last successor
+            elif on_goal:
+                state = parent.move_with_agent(cell, acc + 1, on_goal, 0, next_time)
+                res.append((state, 0, self.get_cat(cell, child_time)))
             else:
-                state, additional_cost = parent.move_with_agent(agent, 0, self.illegal_moves, child_time)
-                res.append((state, 1 + additional_cost, self.get_cat(agent.coords, child_time)))
+                state = parent.move_with_agent(cell, 0, on_goal, 0, next_time)
+                res.append((state, 1, self.get_cat(cell, child_time)))
         return res
 
+    def expand_partial(self, parent: ODState, current_time, delta: int) \
+            -> Tuple[List[Tuple[ODState, int, int]], Optional[int]]:
+        """
+        Create only the next states whose cost + heuristic is exactly delta higher than that of the parent,
+        as used by Enhanced Partial Expansion A*.
+        The moves are taken from the operator table of the agent, which is sorted on the change they cause,
+        so the other moves never have to be created.
+        :param parent: The current state to expand
+        :param current_time: The time belonging to the parent state
+        :param delta: The change in cost + heuristic of the states to create
+        :return: The states as returned by expand,
+                 and the smallest change larger than delta of the remaining next states, None if there are none
+        """
+        if self.team_heuristic is not None:
+            return self.filter_partial(parent, current_time, delta)
+
+        res = []
+        index, cell, acc = parent.get_next()
+        child_time = current_time + 1
+        next_time, reservations = self.get_next_time(parent)
+        next_change = None
+        color = self.colors[index]
+        table = self.heuristics[index]
+        # The operator tables are only computed once EPEA uses them
+        for change, new_cell in self.grid.get_operators(self.heuristic_indexes[index])[cell]:
+            change += acc
+            if change < delta or not parent.valid_next(new_cell) or \
+                    reservations is not None and not reservations.is_free(parent.time + 1, cell, new_cell):
+                continue
+            if change > delta:
+                next_change = change
+                break
+            state = parent.move_with_agent(new_cell, 0, self.grid.on_goal(new_cell, color),
+                                           table[new_cell] - table[cell], next_time)
+            res.append((state, acc + 1, self.get_cat(new_cell, child_time)))
+
+        # Standing still
+        on_goal = self.grid.on_goal(cell, color)
+        change = 0 if on_goal else 1
+        if (change == delta or delta < change and (next_change is None or change < next_change)) \
+                and parent.valid_next(cell) \
+                and (reservations is None or reservations.is_free(parent.time + 1, cell, cell)):
+            if change == delta:
+                state = parent.move_with_agent(cell, acc + 1 if on_goal else 0, on_goal, 0, next_time)
+                res.append((state, change, self.get_cat(cell, child_time)))
+            else:
+                next_change = change
+        return res, next_change
+
+    def filter_partial(self, parent: ODState, current_time, delta: int) \
+            -> Tuple[List[Tuple[ODState, int, int]], Optional[int]]:
+        """
+        Creates the same next states as expand_partial by creating all next states and filtering them.
+        Used for the team heuristic, as its changes can't be taken from the operator tables.
+        :param parent: The current state to expand
+        :param current_time: The time belonging to the parent state
+        :param delta: The change in cost + heuristic of the states to create
+        :return: The states as returned by expand_partial, and the smallest change larger than delta
+        """
+        res = []
+        next_change = None
+        for child in self.expand(parent, current_time):
+            state, cost, _ = child
+            change = cost + state.heuristic - parent.heuristic
+            if change == delta:
+                res.append(child)
+            elif change > delta and (next_change is None or change < next_change):
+                next_change = change
+        return res, next_change
+
+    def get_next_time(self, parent: ODState) -> Tuple[int, Optional[ReservationTable]]:
+        """
+        Gets the time of the next standard state, as stored in the states, and the reservations to check the moves
+        against.
+        :param parent: The state to expand
+        :return: The time and the reservations, None if there are no predetermined paths
+        """
+        if self.reservations is None:
+            return 0, None
+        return self.reservations.get_time(parent.time + 1), self.reservations
+
+    def get_heuristic_change(self, parent: ODState, index: int, new_cell: int) -> int:
+        """
+        Calculates the change in heuristic when the next agent of the state moves to the cell.
+        :param parent: The state
+        :param index: The index of the next agent
+        :param new_cell: The cell the agent moves to
+        :return: The change in heuristic
+        """
+        cell = parent.positions[index]
+        if self.team_heuristic is None:
+            table = self.heuristics[index]
+            return table[new_cell] - table[cell]
+
+        # The agents before the next agent have already moved
+        color = self.colors[index]
+        moved = len(parent.new_positions)
+        cells = [parent.new_positions[i] if i < moved else parent.positions[i] for i in self.teams[color]]
+        old = self.team_heuristic.get(color, tuple(sorted(cells)))
+        cells[cells.index(cell)] = new_cell
+        return self.team_heuristic.get(color, tuple(sorted(cells))) - old
+
     def initial_state(self) -> Tuple[ODState, int]:
         """
         Returns the initial state as well as the initial cost.
-        The initial cost takes into account the predetermined moves used by ID,
+        The initial cost takes into account the cost of the predetermined paths used by ID,
         as well as the initial cost in the mapf.nl cost calculation
         :return: The initial state and the initial cost
         """
-        return self.initial, self.initial.construction_cost + len(self.initial.agents)
+        return self.initial, self.predetermined_cost + len(self.initial.positions)
 
     def is_final(self, state: ODState) -> bool:
         """
         Checks if the given state is a final state.
+        The agents stay on their goals after the final state, so no predetermined agent may still pass their cells.
         :param state: The state to check
         :return: If the state is final
         """
-        return self.grid.is_final(state.agents)
+        if state.goal_count != len(state.positions):
+            return False
+        return self.reservations is None or self.reservations.is_done(state.time, state.positions)
 
     def heuristic(self, state: ODState) -> int:
         """
-        Calculates the heuristic of the state.
+        Returns the heuristic of the state.
         The calculation depends on if specific goals are given or not.
         If goals are assigned the distance to those goals is used as heuristic,
-        otherwise the distance to the nearest goal of the same color is used.
+        otherwise the distance to the nearest goal of the same color is used,
+        or the team heuristic of the agents of the group when it is given.
+        The states keep this value up to date themselves as only one agent moves at a time.
         :param state: The state to calculate for.
         :return: The sum of heuristics for all agents in the state.
         """
-        h = 0
-        if self.assigned_goals is None:
-            for agent in state.new_agents:
-                h += self.grid.get_heuristic(agent.coords, agent.color)
-            for j in range(len(state.new_agents), len(state.agents)):
-                h += self.grid.get_heuristic(state.agents[j].coords, state.agents[j].color)
-        else:
-            for agent in state.new_agents:
-                h += self.grid.get_heuristic(agent.coords, self.assigned_goals[agent.id])
-            for j in range(len(state.new_agents), len(state.agents)):
-                h += self.grid.get_heuristic(state.agents[j].coords, self.assigned_goals[state.agents[j].id])
-        return h
+        return state.heuristic
+
+    def get_paths(self, state_path: List[Tuple[int, ...]]) -> List[AgentPath]:
+        """
+        Turns the positions of the standard states on a path into the paths of the agents.
+        :param state_path: The positions of each standard state on the path
+        :return: The path for each agent
+        """
+        paths = [[] for _ in self.ids]
+        for positions in state_path:
+            for index, cell in enumerate(positions):
+                paths[index].append(self.grid.get_coord(cell))
+        return [AgentPath(id, color, path) for id, color, path in zip(self.ids, self.colors, paths)]
 
-    def get_cat(self, coords, time) -> int:
+    def get_cat(self, cell, time) -> int:
         """
-        Calculates the number of collisions at the given coordinates.
-        :param coords: Where to check for collisions.
+        Calculates the number of collisions at the given cell.
+        :param cell: Where to check for collisions.
         :return: The number of collisions
         """
         res = 0
         for cat in self.cats:
-            res += cat.get_cat(self.agent_ids, coords, time)
+            res += cat.get_cat(self.agent_ids, cell, time)
         return res
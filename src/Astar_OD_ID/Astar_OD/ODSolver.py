@@ -1,21 +1,61 @@
 from __future__ import annotations
 
-from heapq import heappush, heappop
-from typing import List, Optional
+import time
+from array import array
+from typing import List, Optional, Tuple, Callable
 
+from Astar_OD_ID.Astar_OD.Frontier import FrontierType, BucketFrontier, HeapFrontier
 from Astar_OD_ID.Astar_OD.ODProblem import ODProblem
 from Astar_OD_ID.Astar_OD.ODState import ODState
 from src.util.agent_path import AgentPath
+from src.util.budget import BudgetTracker, Status
 from src.util.coord import Coord
 from src.util.logger.logger import Logger
+from src.util.search_stats import SearchStats
 
 logger = Logger("Solver")
 
 
+class PathArena:
+
+    def __init__(self):
+        """
+        Create the storage of the ancestry of a search.
+        Only the positions of expanded standard states are kept, each with the index of its standard parent,
+        so nodes don't need to keep their ancestors and the intermediate states alive.
+        """
+        self.positions: List[Tuple[int, ...]] = []
+        self.parents = array("q")
+
+    def add(self, positions: Tuple[int, ...], parent: int) -> int:
+        """
+        Adds a standard state.
+        :param positions: The positions of the state
+        :param parent: The index of its standard parent, -1 for the initial state
+        :return: The index of the state
+        """
+        self.positions.append(positions)
+        self.parents.append(parent)
+        return len(self.parents) - 1
+
+    def get_path(self, index: int) -> List[Tuple[int, ...]]:
+        """
+        Gets the positions of the standard states from the initial state up to the given state.
+        :param index: The index of the last state, -1 for an empty path
+        :return: The positions of each standard state on the path
+        """
+        path = []
+        while index >= 0:
+            path.append(self.positions[index])
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+
 class Node:
-    __slots__ = ("state", "cost", "heuristic", "conflicts", "time_step", "parent")
+    __slots__ = ("state", "cost", "heuristic", "conflicts", "time_step", "parent", "index")
 
-    def __init__(self, time_step: int, state: ODState, cost, heuristic, conflicts: int, parent=None):
+    def __init__(self, time_step: int, state: ODState, cost, heuristic, conflicts: int, parent: int = -1):
         """
         Construct a node.
         :param time_step: The current time_step
@@ -23,7 +63,7 @@ class Node:
         :param cost: The cost so far
         :param heuristic: The heuristic of the state
         :param conflicts: The number of conflicts so far
-        :param parent: The parent node
+        :param parent: The arena index of the last standard state before this node, -1 if there is none
         """
         self.state = state
         self.cost = cost
@@ -32,22 +72,31 @@ class Node:
         self.time_step = time_step
         self.parent = parent
 
-    def get_path(self) -> List[AgentPath]:
+        # The arena index of the last standard state up to and including this node,
+        # None for a standard state that has not been added to the arena yet
+        self.index = None if state.is_standard() else parent
+
+    def get_index(self, arena: PathArena) -> int:
+        """
+        Gets the arena index used as parent by the children of this node, adding the state when needed.
+        :param arena: The arena of the search
+        :return: The index
+        """
+        if self.index is None:
+            self.index = arena.add(self.state.positions, self.parent)
+        return self.index
+
+    def get_path(self, arena: PathArena) -> List[Tuple[int, ...]]:
         """
         Return the path that lead to this node.
-        :return: The path from the root node to this node.
-        """
-        curr = self
-        state_path = []
-        while curr is not None:
-            if curr.state.is_standard():
-                state_path.insert(0, curr.state)
-            curr = curr.parent
-        paths = [[] for _ in state_path[0].agents]
-        for path in state_path:
-            for index, agent in enumerate(path.agents):
-                paths[index].append(agent.coords)
-        return [AgentPath(agent.id, agent.color, path) for path, agent in zip(paths, state_path[0].agents)]
+        :param arena: The arena of the search
+        :return: The positions of the standard states from the root node to this node.
+        """
+        if self.index is None:
+            path = arena.get_path(self.parent)
+            path.append(self.state.positions)
+            return path
+        return arena.get_path(self.index)
 
     def __lt__(self, other: Node):
         """
@@ -61,53 +110,135 @@ class Node:
 
 class ODSolver:
 
-    def __init__(self, problem: ODProblem, max_cost=None):
+    def __init__(self, problem: ODProblem, max_cost=None, frontier_type: FrontierType = FrontierType.Heap,
+                 enable_epea=False, cancelled: Optional[Callable[[], bool]] = None,
+                 tracker: Optional[BudgetTracker] = None):
         """
         Create a OD A* solver.
         :param problem: The problem to solve.
         :param max_cost: The maximum cost allowed.
+        :param frontier_type: The implementation of the frontier to use.
+        :param enable_epea: Use Enhanced Partial Expansion, which only creates the children with the same cost +
+                heuristic as the parent and puts the parent back in the frontier with the next larger value.
+        :param cancelled: Optional check that is called periodically, the search stops without a solution once it
+                returns True.
+        :param tracker: Optional budget of the search, checked periodically. The search stops without a solution
+                once a limit is exceeded, the status tells which.
         """
         self.problem = problem
         self.max_cost = float("inf") if max_cost is None else max_cost
+        self.frontier_type = frontier_type
+        self.enable_epea = enable_epea
+        self.cancelled = cancelled
+        self.tracker = tracker
+        self.popped = 0
+        self.status = None
+        self.stats = SearchStats()
 
     def solve(self) -> Optional[List[AgentPath]]:
         """
         Solve the given problem.
+        The statistics of the search are kept in the stats attribute.
         :return: A list of non-conflicting path for all agents if a solution exists, otherwise None
         """
+        start_time = time.perf_counter()
+        self.stats.searches += 1
         initial_state, initial_cost = self.problem.initial_state()
         initial_heuristic = self.problem.heuristic(initial_state)
 
         if initial_heuristic + initial_cost > self.max_cost:
+            self.stats.pruned += 1
+            self.status = Status.NoSolution
             return None
+        if self.tracker is not None:
+            self.status = self.tracker.check()
+            if self.status is not None:
+                return None
 
         expanded = set()
-        frontier: List[Node] = []
-        heappush(frontier, Node(0, initial_state, initial_cost, initial_heuristic, 0))
+        arena = PathArena()
+        frontier = BucketFrontier() if self.frontier_type == FrontierType.Bucket else HeapFrontier()
+        frontier.push(Node(0, initial_state, initial_cost, initial_heuristic, 0))
         popped = 0
+        # The counters are kept local in the loop and stored at the end
+        generated = 1
+        expansions = 0
+        # The expansions counted towards the tracker so far
+        charged = 0
+        duplicates = 0
+        pruned = 0
+        peak_frontier = 1
+        solution = None
         while frontier:
             popped += 1
-            current = heappop(frontier)
+            current = frontier.pop()
             if popped % 100000 == 0:
                 logger.log(f"Count: {popped}, Heuristic: {current.heuristic}, Cost: {current.cost}, "
                            f"F: {current.cost + current.heuristic}, Frontier size: {len(frontier)}, "
                            f"Max: {self.max_cost}")
+            if popped % 1024 == 0:
+                if self.tracker is not None:
+                    self.tracker.expand(expansions - charged)
+                    charged = expansions
+                    self.status = self.tracker.check(len(frontier))
+                if self.cancelled is not None and self.cancelled():
+                    self.status = Status.Cancelled
+                if self.status is not None:
+                    break
             if self.problem.is_final(current.state):
-                return current.get_path()
-            if current.state.is_standard():
+                self.status = Status.Solved
+                solution = self.problem.get_paths(current.get_path(arena))
+                break
+            # With EPEA the stored heuristic of a node is raised every time it is put back,
+            # only the first expansion is checked against the expanded states
+            heuristic = self.problem.heuristic(current.state) if self.enable_epea else current.heuristic
+            if current.state.is_standard() and current.heuristic == heuristic:
                 if current.state in expanded:
+                    duplicates += 1
                     continue
                 expanded.add(current.state)
-            states = self.problem.expand(current.state, current.time_step)
+            expansions += 1
+            if self.enable_epea:
+                states, next_delta = self.problem.expand_partial(current.state, current.time_step,
+                                                                 current.heuristic - heuristic)
+                # The node has been popped, so it can be changed and reused
+                if next_delta is not None and current.cost + heuristic + next_delta <= self.max_cost:
+                    current.heuristic = heuristic + next_delta
+                    frontier.push(current)
+            else:
+                states = self.problem.expand(current.state, current.time_step)
+            parent = current.get_index(arena)
             for state, cost_increase, conflicts in states:
                 if state not in expanded:
                     cost = current.cost + cost_increase
                     heuristic = self.problem.heuristic(state)
                     if cost + heuristic <= self.max_cost:
-                        node = Node(current.time_step + 1, state, cost, heuristic, current.conflicts + conflicts,
-                                    current)
-                        heappush(frontier, node)
-        return None
+                        # Only the moves of the last agent complete a time step
+                        time_step = current.time_step + 1 if state.is_standard() else current.time_step
+                        node = Node(time_step, state, cost, heuristic, current.conflicts + conflicts, parent)
+                        frontier.push(node)
+                        generated += 1
+                    else:
+                        pruned += 1
+                else:
+                    duplicates += 1
+            if len(frontier) > peak_frontier:
+                peak_frontier = len(frontier)
+
+        if self.tracker is not None:
+            self.tracker.expand(expansions - charged)
+        if self.status is None:
+            self.status = Status.NoSolution
+        self.popped = popped
+        stats = self.stats
+        stats.generated += generated
+        stats.expanded += expansions
+        stats.duplicates += duplicates
+        stats.pruned += pruned
+        stats.peak_frontier = max(stats.peak_frontier, peak_frontier)
+        stats.peak_closed = max(stats.peak_closed, len(expanded))
+        stats.add_time("search", time.perf_counter() - start_time)
+        return solution
 
     def pretty_print(self, state):
         """
@@ -122,8 +253,8 @@ class ODSolver:
                 if grid.is_wall(coord):
                     symbol = '#'
                 else:
-                    for k, agent in enumerate(state.agents):
-                        if agent.coords == coord:
+                    for k, cell in enumerate(state.positions):
+                        if cell == grid.get_cell(coord):
                             symbol = str(k)
                             break
                 print(symbol, end='')
@@ -1,36 +1,40 @@
 from __future__ import annotations
 
-from typing import Tuple, Optional, Iterator, List
-
-from src.util.agent import Agent
-from src.util.agent_path import AgentPath
+from typing import Tuple, Optional, Iterator
 
 
 class ODState:
-    __slots__ = (
-    "agents", "new_agents", "accumulated_cost", "new_accumulated_cost", "illegal_size", "construction_cost")
+    __slots__ = ("positions", "new_positions", "accumulated_cost", "new_accumulated_cost", "goal_count",
+                 "new_goal_count", "heuristic", "time")
 
-    def __init__(self, agents: Iterator[Agent], new_agents: Optional[Iterator[Agent]] = None,
+    def __init__(self, positions: Iterator[int], new_positions: Optional[Iterator[int]] = None,
                  accumulated_cost: Optional[Iterator[int]] = None, new_accumulated_cost: Optional[Iterator[int]] = None,
-                 illegal_moves_set: Optional[List[AgentPath]] = None, time_step: Optional[int] = None):
+                 goal_count: int = 0, new_goal_count: int = 0, heuristic: int = 0, time: int = 0):
         """
-        Create a state object as used by the A*+OD solver
-        :param agents: The agents in their pre-move state
-        :param new_agents: The agents in their post-move state.
+        Create a state object as used by the A*+OD solver.
+        Agents are stored as the cell index of their position, the order of the agents is owned by the problem.
+        :param positions: The cells of the agents in their pre-move state
+        :param new_positions: The cells of the agents in their post-move state.
         :param accumulated_cost: The accumulated cost for each agent
         :param new_accumulated_cost:  The accumulated cost for each post-move agent
-        :param illegal_moves_set: Set of predetermined paths.
-                Are added to the state when necessary to simplify conflict detection with these paths
-        :param time_step: The time step we are in
+        :param goal_count: The number of pre-move agents that are on a valid goal
+        :param new_goal_count: The number of post-move agents that are on a valid goal
+        :param heuristic: The summed heuristic of the post-move agents and the remaining pre-move agents
+        :param time: The time step of the pre-move state as far as the reservations of predetermined paths are
+                concerned, 0 without reservations
         """
-        self.agents = tuple(agents)
+        self.positions: Tuple[int, ...] = tuple(positions)
+        self.goal_count = goal_count
 
         # If enough intermediary states make them permanent
-        self.new_agents = () if new_agents is None else tuple(new_agents)
-        if len(self.new_agents) == len(self.agents):
-            self.agents = self.new_agents
-            self.new_agents = ()
-        self.accumulated_cost: Tuple[int] = tuple(0 for _ in self.agents) if accumulated_cost is None else tuple(
+        self.new_positions: Tuple[int, ...] = () if new_positions is None else tuple(new_positions)
+        self.new_goal_count = new_goal_count
+        if len(self.new_positions) == len(self.positions):
+            self.positions = self.new_positions
+            self.new_positions = ()
+            self.goal_count = self.new_goal_count
+            self.new_goal_count = 0
+        self.accumulated_cost: Tuple[int] = tuple(0 for _ in self.positions) if accumulated_cost is None else tuple(
             accumulated_cost)
 
         # If enough intermediary costs make them permanent
@@ -39,76 +43,63 @@ class ODState:
             self.accumulated_cost = self.new_accumulated_cost
             self.new_accumulated_cost = ()
 
-        # Named lambda for getting the move from the illegal_moves at the correct time step
-        def get_illegal(illegal_moves):
-            return illegal_moves[time_step + 1] if time_step + 1 < len(illegal_moves) else illegal_moves[-1]
-
-        self.illegal_size = 0
-
-        # This cost reflects the cost of the predetermined moves
-        self.construction_cost = 0
+        self.heuristic = heuristic
+        self.time = time
 
-        # If we have a standard state make the predetermined/illegal moves,
-        # this way the valid_next method will automatically check for conflicts
-        if len(self.new_agents) == 0 and illegal_moves_set is not None and time_step is not None:
-            self.new_agents = tuple(
-                Agent(illegal_moves.agent_id, get_illegal(illegal_moves), illegal_moves.color) for illegal_moves in
-                illegal_moves_set)
-            self.illegal_size = len(self.new_agents)
+        assert len(self.new_positions) == len(self.new_accumulated_cost)
+        assert len(self.positions) == len(self.accumulated_cost)
 
-            # Calculate the cost of the predetermined moves
-            acc_costs = []
-            for i, agent in enumerate(self.new_agents):
-                # Agent has moves so cost of 1 + accumulated cost
-                if agent.coords != self.agents[i].coords:
-                    self.construction_cost += 1 + self.accumulated_cost[i]
-                    acc_costs.append(0)
-                else:
-                    # Agent is on goal node so increase the accumulated cost
-                    if illegal_moves_set[i][-1] == agent.coords:
-                        acc_costs.append(1 + self.accumulated_cost[i])
-                    else:
-                        # Agent is waiting on non-goal node, so increase cost by 1 as no accumulated cost can exist
-                        self.construction_cost += 1
-                        acc_costs.append(0)
-            self.new_accumulated_cost = tuple(acc_costs)
-
-        assert len(self.new_agents) == len(self.new_accumulated_cost)
-        assert len(self.agents) == len(self.accumulated_cost)
-
-    def get_next(self) -> Tuple[Agent, int]:
+    def get_next(self) -> Tuple[int, int, int]:
         """
-        Returns the next agent without a move as well as its index and its previous accumulated cost
+        Returns the index of the next agent without a move as well as its cell and its previous accumulated cost
         """
-        i = len(self.new_agents)
-        return self.agents[i], self.accumulated_cost[i]
+        i = len(self.new_positions)
+        return i, self.positions[i], self.accumulated_cost[i]
 
-    def move_with_agent(self, agent, acc_cost, illegal_moves_set: List[AgentPath], time_step) -> Tuple[ODState, int]:
+    def move_with_agent(self, cell: int, acc_cost, on_goal: bool, heuristic_change: int, time: int) -> ODState:
         """
-        Makes the agent the next intermediary agent with associated acc cost.
+        Makes the cell the next intermediary agent position with associated acc cost.
         Should be used together with the data retrieved from get_next()
+        The heuristic change is the difference in heuristic between the new cell and the previous cell of the agent.
+        The child is built directly from this state instead of through the constructor, as it is created for every
+        move.
+        :param time: The time of the child when the move completes the time step, see the constructor
         """
-        new_agents = list(self.new_agents)
-        new_agents.append(agent)
-        new_acc_cost = list(self.new_accumulated_cost)
-        new_acc_cost.append(acc_cost)
-        state = ODState(self.agents, new_agents, self.accumulated_cost, new_acc_cost,
-                        illegal_moves_set=illegal_moves_set, time_step=time_step)
-        return state, state.construction_cost
-
-    def valid_next(self, new_agent: Agent) -> bool:
+        state = ODState.__new__(ODState)
+        state.heuristic = self.heuristic + heuristic_change
+        if len(self.new_positions) + 1 < len(self.positions):
+            state.positions = self.positions
+            state.accumulated_cost = self.accumulated_cost
+            state.goal_count = self.goal_count
+            state.new_positions = self.new_positions + (cell,)
+            state.new_accumulated_cost = self.new_accumulated_cost + (acc_cost,)
+            state.new_goal_count = self.new_goal_count + on_goal
+            state.time = self.time
+        else:
+            # The move completes the time step, so the child is a standard state
+            state.positions = self.new_positions + (cell,)
+            state.accumulated_cost = self.new_accumulated_cost + (acc_cost,)
+            state.goal_count = self.new_goal_count + on_goal
+            state.new_positions = ()
+            state.new_accumulated_cost = ()
+            state.new_goal_count = 0
+            state.time = time
+        return state
+
+    def valid_next(self, new_cell: int) -> bool:
         """
-        Verifies if the given agent would cause conflicts with the current agents.
-        :param new_agent: The agent to check for.
+        Verifies if an agent moving to the given cell would cause conflicts with the current agents.
+        :param new_cell: The cell to check for.
         :return: True if no conflicts would be caused.
         """
-        for i, agent in enumerate(self.new_agents):
+        current = self.positions[len(self.new_positions)]
+        for i, cell in enumerate(self.new_positions):
             # Vertex conflict
-            if agent.coords == new_agent.coords:
+            if cell == new_cell:
                 return False
 
             # Swapping conflict
-            if agent.coords == self.agents[len(self.new_agents)].coords and new_agent.coords == self.agents[i].coords:
+            if cell == current and new_cell == self.positions[i]:
                 return False
         return True
 
@@ -117,11 +108,12 @@ class ODState:
         Returns if the state is standard or intermediate.
         :return: True if the state is standard.
         """
-        # A state is standard if either there are no non-predetermined post_move agents
-        return len(self.new_agents) == self.illegal_size
+        # A state is standard if there are no post-move agents
+        return len(self.new_positions) == 0
 
     def __hash__(self) -> int:
-        return tuple.__hash__((self.agents, self.new_agents))
+        return tuple.__hash__((self.positions, self.new_positions, self.time))
 
     def __eq__(self, other):
-        return self.agents == other.agents and self.new_agents == other.new_agents
+        return self.positions == other.positions and self.new_positions == other.new_positions \
+               and self.time == other.time
@@ -1,31 +1,85 @@
-from typing import Optional, List, Iterator, Tuple
+from __future__ import annotations
+
+import time
+import warnings
+from typing import Optional, List, Iterator, Tuple, Callable, Dict
 
 from mapfmclient import Problem, Solution
 
 from Astar_OD_ID.Astar_ID.IDProblem import IDProblem
+from Astar_OD_ID.Astar_OD.Frontier import FrontierType
 from src.util.CAT import CAT
 from src.util.agent_path import AgentPath
+from src.util.budget import Budget, BudgetTracker, Status
+from src.util.conflict_index import ConflictIndex
 from src.util.grid import HeuristicType, Grid
+from src.util.heuristic_cache import HeuristicCache
 from src.util.group import Group
 from src.util.groups import Groups
 from src.util.logger.logger import Logger
+from src.util.search_stats import SearchStats
 
 logger = Logger("MatchingSolver")
 
 
 class MatchingSolver:
 
-    def __init__(self, problem: Problem, heuristic_type: HeuristicType = HeuristicType.Exhaustive, enable_sorting=False,
-                 enable_matchingID=False):
+    def __init__(self, problem: Problem, heuristic_type: HeuristicType = HeuristicType.Exhaustive, enable_sorting=None,
+                 enable_matchingID=False, frontier_type: FrontierType = FrontierType.Heap, enable_epea=False,
+                 workers=1, heuristic_cache: Optional[HeuristicCache] = None, enable_team_heuristic=False,
+                 budget: Optional[Budget] = None, search_budget: Optional[Budget] = None, enable_anytime=False,
+                 improved: Optional[Callable[[Solution, int], None]] = None):
         """
         Create a problem that uses matching ID, only makes sense for Exhaustive matching.
         :param problem: The problem to solve.
         :param heuristic_type: The heuristic type.
+        :param enable_sorting: Deprecated, has no effect as goal assignments are always tried in order of their
+                initial heuristic.
+        :param frontier_type: The frontier implementation used by the A*+OD solvers.
+        :param enable_epea: Use Enhanced Partial Expansion in the A*+OD solvers.
+        :param workers: The number of processes used to try goal assignments in parallel with exhaustive matching.
+        :param heuristic_cache: Optional on-disk cache of the distance tables.
+        :param enable_team_heuristic: Take into account that the agents of a team need distinct goals in the heuristic,
+                only used with heuristic matching.
+        :param budget: Optional limits of every call to solve, once exceeded solve returns None and the status
+                tells which limit was exceeded.
+        :param search_budget: Optional limits of every A*+OD search, exceeding them also stops the solve.
+        :param enable_anytime: Keep track of the best solution found while solving, which solve returns instead of
+                None once a limit of the budget is exceeded. Exhaustive matching finds a solution for every goal
+                assignment it tries, so the first one is found early and improved upon after.
+        :param improved: Optional callback that is called with every improved solution and the lower bound on the
+                cost proven so far, only used in anytime mode.
         """
-        self.grid = Grid(problem.grid, problem.width, problem.height, problem.starts, problem.goals, heuristic_type)
+        if enable_sorting is not None:
+            warnings.warn("enable_sorting has no effect, goal assignments are always sorted", DeprecationWarning,
+                          stacklevel=2)
+        # The statistics of the construction and all calls to solve
+        self.stats = SearchStats()
+        start_time = time.perf_counter()
+        self.grid = Grid(problem.grid, problem.width, problem.height, problem.starts, problem.goals, heuristic_type,
+                         heuristic_cache=heuristic_cache)
+        self.stats.add_time("grid", time.perf_counter() - start_time)
         self.heuristic_type = heuristic_type
-        self.enable_sorting = enable_sorting
         self.enable_matchingID = enable_matchingID
+        self.frontier_type = frontier_type
+        self.enable_epea = enable_epea
+        self.workers = workers
+        self.enable_team_heuristic = enable_team_heuristic
+        self.budget = budget
+        self.search_budget = search_budget
+        self.enable_anytime = enable_anytime
+        self.improved = improved
+        self.status: Optional[Status] = None
+        # The budget of the last call to solve, which keeps the peak memory with enable_peak_memory
+        self.tracker: Optional[BudgetTracker] = None
+
+        # The best solution of the last call to solve and the lower bound on its cost, only kept in anytime mode
+        self.best: Optional[Solution] = None
+        self.best_cost = float("inf")
+        self.lower_bound = 0
+
+        # The lower bound of each group solved by the last call to solve
+        self.bounds: Dict[Tuple[int, ...], int] = dict()
 
         if enable_matchingID:
             max_team = max(map(lambda x: x.color, self.grid.starts))
@@ -38,52 +92,131 @@ class MatchingSolver:
         """
         Solve the problem
         :param enable_cat: Option to disable the Collision Avoidance for this layer. Has no effect on normal ID CAT
+        :return: A solution if it exists. In anytime mode the best solution found so far when a limit of the budget
+                 is exceeded, the status then tells which one.
+        """
+        start_time = time.perf_counter()
+        solution = self.solve_id(enable_cat)
+        self.stats.add_time("total", time.perf_counter() - start_time)
+        return solution
+
+    def solve_id(self, enable_cat: bool) -> Optional[Solution]:
+        """
+        Solve the problem with the groups of A*+ID+OD, combined by matching ID if it is enabled.
+        :param enable_cat: Option to disable the Collision Avoidance for this layer
         :return: A solution if it exists.
         """
+        tracker = None if self.budget is None else self.budget.start()
+        self.tracker = tracker
+        self.status = None
+        self.best = None
+        self.best_cost = float("inf")
+        self.lower_bound = 0
+        self.bounds = dict()
         if not self.enable_matchingID:
-            id_problem = IDProblem(self.grid, self.heuristic_type, Group(list(range(len(self.grid.starts)))),
-                                   enable_sorting=self.enable_sorting)
-            paths = id_problem.solve()
-            if paths is None:
-                return None
+            paths = self.solve_group(Group(list(range(len(self.grid.starts)))), None, tracker)
+            if self.status != Status.Solved:
+                return self.best if self.enable_anytime else None
             return AgentPath.to_solution(paths)
-        path_set = GroupPathSet(list(range(len(self.grid.starts))), self.grid.w, self.grid.h, self.teams, enable_cat)
+        path_set = GroupPathSet(list(range(len(self.grid.starts))), self.grid, self.teams, enable_cat)
         for group in path_set.groups.groups:
             logger.log(f"Solving agents: {group}")
-            id_problem = IDProblem(self.grid, self.heuristic_type, group, enable_sorting=self.enable_sorting)
-            paths = id_problem.solve(cat=path_set.cat)
-            if paths is None:
-                return None
+            paths = self.solve_group(group, path_set.cat, tracker, path_set)
+            if self.status != Status.Solved:
+                return self.best if self.enable_anytime else None
             path_set.update(paths)
         conflict = path_set.find_conflict()
         while conflict is not None:
             a, b = conflict
             new_group = path_set.groups.combine_agents(a, b)
+            self.stats.merges += 1
             logger.log(f"Solving agents: {new_group}")
-            id_problem = IDProblem(self.grid, self.heuristic_type, new_group, enable_sorting=self.enable_sorting)
-            paths = id_problem.solve(cat=path_set.cat)
-            if paths is None:
-                return None
+            paths = self.solve_group(new_group, path_set.cat, tracker, path_set)
+            if self.status != Status.Solved:
+                return self.best if self.enable_anytime else None
             path_set.update(paths)
             conflict = path_set.find_conflict()
         return AgentPath.to_solution(path_set.paths)
 
+    def solve_group(self, group: Group, cat: Optional[CAT], tracker: Optional[BudgetTracker],
+                    path_set: Optional[GroupPathSet] = None) -> Optional[List[AgentPath]]:
+        """
+        Solves a group with A*+ID+OD and records its status.
+        :param group: The group
+        :param cat: The optional Collision Avoidance table of the other groups
+        :param tracker: The budget of the whole solve
+        :param path_set: The paths of the other groups with matching ID, used to find solutions in anytime mode
+        :return: The paths of the group if a solution exists, otherwise None
+        """
+        improved = None
+        if self.enable_anytime:
+            improved = lambda paths, lower_bound: self.improve(group, paths, lower_bound, path_set)
+        id_problem = IDProblem(self.grid, self.heuristic_type, group,
+                               frontier_type=self.frontier_type, enable_epea=self.enable_epea,
+                               workers=self.workers, enable_team_heuristic=self.enable_team_heuristic,
+                               tracker=tracker, search_budget=self.search_budget,
+                               enable_anytime=self.enable_anytime, improved=improved)
+        paths = id_problem.solve(cat=cat)
+        self.status = id_problem.status
+        self.stats.add(id_problem.stats)
+        if improved is not None and paths is not None:
+            improved(paths, id_problem.lower_bound)
+        return paths
+
+    def improve(self, group: Group, paths: List[AgentPath], lower_bound: int, path_set: Optional[GroupPathSet]):
+        """
+        Records a solution of a group in anytime mode. Together with the paths of the other groups it is a solution
+        of the whole problem if no two paths conflict, which is kept and published if it improves the best solution.
+        The groups are solved without the agents of the other groups, so their lower bounds add up.
+        :param group: The group
+        :param paths: The paths of the group
+        :param lower_bound: The lower bound on the cost of the group
+        :param path_set: The paths of the other groups with matching ID
+        """
+        self.bounds[group.agent_ids] = lower_bound
+        others = []
+        if path_set is not None:
+            self.lower_bound = max(self.lower_bound,
+                                   sum(self.bounds.get(other.agent_ids, 0) for other in path_set.groups))
+            members = set(group.agent_ids)
+            others = [path for i, path in enumerate(path_set.paths) if i not in members]
+            # Not every group has been solved yet
+            if any(path is None for path in others):
+                return
+            # The other groups were solved independently of each other as well, so the whole solution is checked
+            conflicts = ConflictIndex(self.grid, list(range(len(self.grid.starts))))
+            for path in list(paths) + others:
+                conflicts.add(path)
+            if conflicts.find_conflict() is not None:
+                return
+        else:
+            self.lower_bound = max(self.lower_bound, lower_bound)
+
+        cost = sum(path.get_cost() for path in paths) + sum(path.get_cost() for path in others)
+        if cost >= self.best_cost:
+            return
+        self.best_cost = cost
+        self.best = AgentPath.to_solution(sorted(list(paths) + others, key=lambda path: path.agent_id))
+        logger.log(f"Improved solution with cost {cost}, lower bound {self.lower_bound}")
+        if self.improved is not None:
+            self.improved(self.best, self.lower_bound)
+
 
 class GroupPathSet:
 
-    def __init__(self, agent_ids, w, h, teams: List[Group], enable_cat):
+    def __init__(self, agent_ids, grid: Grid, teams: List[Group], enable_cat):
         """
         Create a path set used to track the paths for MatchingID.
         :param agent_ids: The agent_ids
-        :param w: The width of the grid
-        :param h: The height of the grid
+        :param grid: The grid
         :param teams: The teams
         :param enable_cat: If CAT should be used
         """
         self.groups = Groups(teams)
         self.remove_one_groups()
         self.paths: List[Optional[AgentPath]] = [None for _ in range(len(agent_ids))]
-        self.cat = CAT(agent_ids, w, h) if enable_cat else CAT.empty()
+        self.cat = CAT(grid) if enable_cat else CAT.empty()
+        self.conflicts = ConflictIndex(grid, agent_ids)
 
     def update(self, new_paths: Iterator[AgentPath]):
         """
@@ -93,19 +226,19 @@ class GroupPathSet:
         for path in new_paths:
             i = path.agent_id
             self.cat.remove_cat(self.paths[i])
+            self.conflicts.remove(self.paths[i])
             self.paths[i] = path
             self.cat.add_cat(path)
+            self.conflicts.add(path)
 
     def find_conflict(self) -> Optional[Tuple[int, int]]:
         """
         Finds a conflict among the stored paths.
+        Only paths that share a cell, a move or a final cell are ever compared,
+        so agents of the same group, which are solved together, are not checked again.
         :return: The first found conflict.
         """
-        for i in range(len(self.paths)):
-            for j in range(i + 1, len(self.paths)):
-                if self.paths[i].conflicts(self.paths[j]):
-                    return i, j
-        return None
+        return self.conflicts.find_conflict()
 
     def remove_one_groups(self):
         """
@@ -0,0 +1,58 @@
+import time
+
+from func_timeout import func_timeout, FunctionTimedOut
+from mapfmclient import Problem
+
+from Astar_OD_ID.Astar_OD.Frontier import FrontierType
+from Astar_OD_ID.Astar_OD.ODProblem import ODProblem
+from Astar_OD_ID.Astar_OD.ODSolver import ODSolver
+from benchmarking.map_parser import MapParser
+from src.util.CAT import CAT
+from src.util.grid import Grid, HeuristicType
+from src.util.group import Group
+
+
+def run(problem: Problem, frontier_type: FrontierType, time_out):
+    """
+    Solves all agents of the problem as one A*+OD group with heuristic matching.
+    :param problem: The problem
+    :param frontier_type: The frontier implementation to use
+    :param time_out: The maximum time in seconds
+    :return: The number of popped nodes and the time it took, None if it timed out
+    """
+    grid = Grid(problem.grid, problem.width, problem.height, problem.starts, problem.goals, HeuristicType.Heuristic)
+    od_problem = ODProblem(grid, Group(range(len(problem.starts))), [CAT.empty()])
+    solver = ODSolver(od_problem, frontier_type=frontier_type)
+    start_time = time.perf_counter()
+    try:
+        func_timeout(time_out, solver.solve)
+    except FunctionTimedOut:
+        return None
+    return solver.popped, time.perf_counter() - start_time
+
+
+def benchmark(map_root, folder, time_out):
+    """
+    Compares the pops per second of the frontier implementations on all maps in the folder.
+    Maps that time out for any of the implementations are skipped.
+    :param map_root: The root of the maps
+    :param folder: The folder to benchmark
+    :param time_out: The maximum time in seconds per map and implementation
+    """
+    problems = MapParser(map_root).parse_batch(folder)
+    totals = dict((frontier_type, [0, 0]) for frontier_type in FrontierType)
+    for name, problem in problems:
+        results = dict((frontier_type, run(problem, frontier_type, time_out)) for frontier_type in FrontierType)
+        if any(result is None for result in results.values()):
+            print(f"{name}: timed out")
+            continue
+        for frontier_type, (popped, seconds) in results.items():
+            totals[frontier_type][0] += popped
+            totals[frontier_type][1] += seconds
+    for frontier_type, (popped, seconds) in totals.items():
+        if seconds > 0:
+            print(f"{frontier_type.name}: {popped} pops in {seconds:.2f}s, {popped / seconds:.0f} pops/s")
+
+
+if __name__ == "__main__":
+    benchmark("../../maps", "Obstacle-20x20-A6_T3", 30)
@@ -8,6 +8,7 @@ from typing import List, Tuple
 from mapfmclient import Problem, MarkedLocation
 
 from src.util.coord import Coord
+from src.util.wall_grid import WallGrid
 
 
 class MapGenerator:
@@ -230,10 +231,16 @@ def progressive(grid, scen_path, num_agents, num_teams):
     return Problem(grid, len(grid[0]), len(grid), starts, goals)
 
 
-def load_map(map_path):
+def load_map(map_path) -> WallGrid:
     with open(map_path) as f:
         map_text = f.readlines()
-    return [[0 if c == '.' else 1 for c in row.strip()] for row in map_text[4:] if row.strip() != ""]
+    rows = [row.strip() for row in map_text[4:] if row.strip() != ""]
+    grid = WallGrid(len(rows[0]), len(rows))
+    # Everything but . is a wall in the movingai maps
+    walls = WallGrid.translation(lambda c: c != ".")
+    for y, row in enumerate(rows):
+        grid.read_row(y, row, walls)
+    return grid
 
 
 if __name__ == '__main__':
@@ -3,6 +3,11 @@ from typing import Tuple, List
 
 from mapfmclient import MarkedLocation, Problem
 
+from src.util.wall_grid import WallGrid
+
+# Only @ is a wall in the map files
+WALLS = WallGrid.translation(lambda c: c == "@")
+
 
 class MapParser:
 
@@ -20,9 +25,9 @@ class MapParser:
         height_line = list(lines[1].split(" "))
         width = int(width_line[1])
         height = int(height_line[1])
-        grid = []
+        grid = WallGrid(width, height)
         for i in range(height):
-            grid.append([int(c == "@") for c in lines[2 + i]])
+            grid.read_row(i, lines[2 + i], WALLS)
         agents = int(lines[2 + height])
         starts = []
         starting_line = 3 + height
@@ -44,5 +49,7 @@ class MapParser:
         return Problem(grid, width, height, starts, goals)
 
     def parse_batch(self, folder) -> List[Tuple[str, Problem]]:
-        paths = os.listdir(os.path.join(self.map_root, folder))
-        return [(str(path), self.parse_map(str(os.path.join(folder, path)))) for path in paths]
+        return [(path, self.parse_map(os.path.join(folder, path))) for path in self.list_batch(folder)]
+
+    def list_batch(self, folder) -> List[str]:
+        return sorted(str(path) for path in os.listdir(os.path.join(self.map_root, folder)))
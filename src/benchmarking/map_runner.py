@@ -1,6 +1,11 @@
+import hashlib
+import json
 import os
+import socket
+import sqlite3
+import threading
 from multiprocessing import Pool
-from typing import Optional
+from typing import Optional, Set, Tuple
 
 import time
 from func_timeout import func_timeout, FunctionTimedOut
@@ -8,108 +13,347 @@ from mapfmclient import Problem, Solution
 
 from Astar_OD_ID.MatchingSolver import MatchingSolver
 from benchmarking.map_parser import MapParser
+from src.util.agent_path import AgentPath
+from src.util.budget import Budget, Status
+from src.util.coord import Coord
 from src.util.grid import HeuristicType
+from src.util.heuristic_cache import HeuristicCache
+
+# The status of a result record for each solver status
+STATUS_NAMES = {
+    Status.Solved: "solved",
+    Status.NoSolution: "no_solution",
+    Status.Cancelled: "cancelled",
+    Status.Deadline: "timeout",
+    Status.Expansions: "expansions",
+    Status.Frontier: "frontier",
+    Status.Memory: "memory",
+}
 
 
 class BenchmarkQueue:
 
-    def __init__(self, name):
+    def __init__(self, name, owner: Optional[str] = None, lease: float = 4 * 60 * 60, wal=False):
+        """
+        Create or open a work queue stored in an SQLite database, which can be shared by several runners on one host.
+        The database has to be on a local filesystem, SQLite's file locking is unreliable on network filesystems
+        such as NFS, so claims and leases would not be atomic and a task could be run twice or lost.
+        Claiming and completing a task are single transactions, so a task is never handed out twice.
+        A claimed task is leased to its owner, once the lease expires another runner can take it over,
+        so the tasks of crashed runners are not lost. Runners renew the lease of a task while they work on it.
+        A runner that is restarted with the same owner resumes its claimed tasks first.
+        :param name: The path of the database
+        :param owner: The name of this runner, defaults to the host and process id
+        :param lease: The time in seconds a runner has to complete or renew a task
+        :param wal: Use write-ahead logging, so readers don't block the writer
+        """
         self.name = name
-        with open(name, 'a'):
-            pass
+        self.owner = f"{socket.gethostname()}-{os.getpid()}" if owner is None else owner
+        self.lease = lease
+        # The ids of the tasks claimed by this run
+        self.claimed: Set[int] = set()
+        # Transactions are managed explicitly
+        self.connection = self.connect()
+        if wal:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                "data TEXT NOT NULL, owner TEXT, expires REAL, completed INTEGER NOT NULL DEFAULT 0)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS open_tasks ON tasks (completed, id)")
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection to the database, a connection can only be used by the thread that opened it.
+        :return: The connection
+        """
+        return sqlite3.connect(self.name, timeout=60, isolation_level=None)
+
+    def get_next(self) -> Optional[Tuple[int, str]]:
+        """
+        Claims the next task, the open tasks of an earlier run with this owner come first,
+        followed by the unclaimed tasks and the tasks with an expired lease.
+        :return: The id and data of the task, None if there are no tasks left to claim
+        """
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            claimed = tuple(self.claimed)
+            row = self.connection.execute("SELECT id, data FROM tasks WHERE completed = 0 AND owner = ? AND id NOT IN "
+                                          f"({', '.join('?' * len(claimed))}) ORDER BY id LIMIT 1",
+                                          (self.owner,) + claimed).fetchone()
+            if row is None:
+                row = self.connection.execute("SELECT id, data FROM tasks WHERE completed = 0 AND "
+                                              "(owner IS NULL OR expires < ?) ORDER BY id LIMIT 1",
+                                              (now,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE tasks SET owner = ?, expires = ? WHERE id = ?",
+                                        (self.owner, now + self.lease, row[0]))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        self.claimed.add(row[0])
+        return row[0], row[1]
+
+    def renew(self, task_id: int, connection: Optional[sqlite3.Connection] = None) -> bool:
+        """
+        Extends the lease of a claimed task.
+        :param task_id: The id of the task returned by get_next
+        :param connection: The connection to use, the connection of the queue by default
+        :return: False if the task is no longer claimed by this runner, as its lease expired and it was taken over
+        """
+        connection = self.connection if connection is None else connection
+        cursor = connection.execute("UPDATE tasks SET expires = ? WHERE id = ? AND owner = ? AND completed = 0",
+                                    (time.time() + self.lease, task_id, self.owner))
+        return cursor.rowcount > 0
+
+    def heartbeat(self, task_id: int) -> "LeaseHeartbeat":
+        """
+        Creates a heartbeat that renews the lease of a task in the background while it is used as context manager.
+        :param task_id: The id of the task returned by get_next
+        :return: The heartbeat
+        """
+        return LeaseHeartbeat(self, task_id)
+
+    def completed(self, task_id: int) -> bool:
+        """
+        Marks a claimed task as completed.
+        :param task_id: The id of the task returned by get_next
+        :return: False if the task was no longer claimed by this runner, it is then left to the runner that took it
+        """
+        self.claimed.discard(task_id)
+        cursor = self.connection.execute("UPDATE tasks SET completed = 1 WHERE id = ? AND owner = ?",
+                                         (task_id, self.owner))
+        return cursor.rowcount > 0
+
+    def add(self, data: str):
+        """
+        Adds a task to the end of the queue.
+        :param data: The task
+        """
+        self.connection.execute("INSERT INTO tasks (data) VALUES (?)", (data,))
+
+
+class LeaseHeartbeat:
+
+    def __init__(self, queue: BenchmarkQueue, task_id: int):
+        """
+        Renews the lease of a task every quarter of the lease in a background thread, so tasks that take longer
+        than the lease are not taken over by other runners. The thread uses its own connection to the database.
+        :param queue: The queue of the task
+        :param task_id: The id of the task
+        """
+        self.queue = queue
+        self.task_id = task_id
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
 
-    def get_next(self):
-        with open(self.name, 'r') as f:
-            return f.readline().strip()
+    def run(self):
+        """
+        Renews the lease until the heartbeat is stopped or the task was taken over.
+        """
+        connection = self.queue.connect()
+        try:
+            while not self.stopped.wait(self.queue.lease / 4):
+                try:
+                    if not self.queue.renew(self.task_id, connection):
+                        print(f"Lost the lease of task {self.task_id}")
+                        return
+                except sqlite3.OperationalError as e:
+                    # The database stayed locked, the next renewal is still in time
+                    print(f"Failed to renew the lease of task {self.task_id}: {e}")
+        finally:
+            connection.close()
 
-    def completed(self):
-        with open(self.name, 'r') as fin:
-            data = fin.read().splitlines(True)
-        with open(self.name, 'w') as fout:
-            fout.writelines(data[1:])
+    def __enter__(self):
+        self.thread.start()
+        return self
 
-    def add(self, data):
-        with open(self.name, 'a') as f:
-            f.write(data + "\n")
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
 
 
 class Dummy:
 
-    def __init__(self, timeout, heuristic_type, enable_id, enable_sorting):
+    def __init__(self, map_root, timeout, heuristic_type, enable_id, heuristic_cache=None):
+        self.map_root = map_root
         self.timeout = timeout
         self.heuristic_type = heuristic_type
         self.enable_id = enable_id
-        self.enable_sorting = enable_sorting
+        self.heuristic_cache = heuristic_cache
 
     def __call__(self, object):
-        return object[0], test(object[1], self.timeout, self.heuristic_type, self.enable_id, self.enable_sorting)
+        # The map is parsed in the worker, so the runner never holds a whole batch
+        folder, name = object
+        problem = MapParser(self.map_root).parse_map(os.path.join(folder, name))
+        record = test(problem, self.timeout, self.heuristic_type, self.enable_id, self.heuristic_cache)
+        record["folder"] = folder
+        record["file"] = name
+        return record
 
 
 class MapRunner:
 
-    def __init__(self, map_root, heuristic_type):
+    def __init__(self, map_root, heuristic_type, heuristic_cache: Optional[HeuristicCache] = None, processes=10,
+                 enable_id=True, max_tasks_per_child: Optional[int] = 20):
+        """
+        Create a runner that benchmarks the maps of a folder in a pool of worker processes.
+        :param map_root: The root of the maps
+        :param heuristic_type: The heuristic type
+        :param heuristic_cache: Optional on-disk cache of the distance tables
+        :param processes: The number of worker processes
+        :param enable_id: Use matching ID
+        :param max_tasks_per_child: The number of maps a worker solves before it is replaced,
+                so memory it keeps is returned. None to keep the workers for the whole folder.
+        """
         self.map_root = map_root
         self.heuristic_type = heuristic_type
+        self.heuristic_cache = heuristic_cache
+        self.processes = processes
+        self.enable_id = enable_id
+        self.max_tasks_per_child = max_tasks_per_child
         self.map_parser = MapParser(map_root)
 
     def test_queue(self, timeout, queue: BenchmarkQueue, output):
+        """
+        Benchmarks the folders of the queue until it is empty, appending the results to the output.
+        :param timeout: The maximum time in seconds per map
+        :param queue: The queue of folders
+        :param output: The result file
+        """
         task = queue.get_next()
-        while task is not None and task != "":
-            print(task)
-            res = self.test_generated(timeout, task)
-            with open(output, 'a') as f:
-                for r in res:
-                    f.write(f"{task}, {r[0]}, {r[1]}\n")
-                queue.completed()
-                task = queue.get_next()
-
-    def test_generated(self, timeout, folder):
-        problems = self.map_parser.parse_batch(folder)
-
-        with Pool(processes=processes) as p:
-            res = p.map(Dummy(timeout, self.heuristic_type, enable_id, enable_sorting), problems)
-        print()
-        return res
+        while task is not None:
+            task_id, folder = task
+            print(folder)
+            with queue.heartbeat(task_id):
+                self.test_generated(timeout, folder, output)
+            queue.completed(task_id)
+            task = queue.get_next()
 
+    def test_generated(self, timeout, folder, output):
+        """
+        Benchmarks the maps of a folder, every result is appended to the output as soon as it is done.
+        Maps that already have a result in the output are skipped, so an interrupted folder can be resumed.
+        :param timeout: The maximum time in seconds per map
+        :param folder: The folder
+        :param output: The result file
+        """
+        finished = self.load_finished(output)
+        names = [name for name in self.map_parser.list_batch(folder) if (folder, name) not in finished]
 
-def test(problem: Problem, time_out, heuristic_type, enable_id, enable_sorting):
-    start_time = time.process_time()
-    solution = timeout(problem, time_out, heuristic_type, enable_id, enable_sorting)
-    print('.', end='', flush=True)
-    if solution is not None:
-        return time.process_time() - start_time
-    else:
-        return None
+        dummy = Dummy(self.map_root, timeout, self.heuristic_type, self.enable_id, self.heuristic_cache)
+        with Pool(processes=self.processes, maxtasksperchild=self.max_tasks_per_child) as p, open(output, 'a') as f:
+            for record in p.imap_unordered(dummy, [(folder, name) for name in names]):
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+        print()
 
+    @staticmethod
+    def load_finished(output) -> Set[Tuple[str, str]]:
+        """
+        Reads which maps already have a result, both records and the older "folder, file, seconds" lines.
+        :param output: The result file
+        :return: The folder and file of every result
+        """
+        finished = set()
+        if not os.path.exists(output):
+            return finished
+        with open(output) as f:
+            for line in f:
+                if line.lstrip().startswith("{"):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut off by a crash, the map is run again
+                        continue
+                    finished.add((record["folder"], record["file"]))
+                elif line.strip() != "":
+                    split = line.split(",")
+                    finished.add((split[0].strip(), split[1].strip()))
+        return finished
 
-def timeout(current_problem: Problem, time_out, heuristic_type, enable_id, enable_sorting) -> Optional[Solution]:
-    try:
-        sol = func_timeout(time_out, solve, args=(current_problem, heuristic_type, enable_id, enable_sorting))
 
+def test(problem: Problem, time_out, heuristic_type, enable_id, heuristic_cache=None) -> dict:
+    """
+    Solves a problem and describes the result.
+    :param problem: The problem
+    :param time_out: The maximum time in seconds
+    :param heuristic_type: The heuristic type
+    :param enable_id: Use matching ID
+    :param heuristic_cache: Optional on-disk cache of the distance tables
+    :return: The result record with the configuration, status, cost, wall and CPU time,
+             search statistics, peak memory and the hash of the problem
+    """
+    record = {
+        "config": {
+            "heuristic_type": heuristic_type.name,
+            "enable_id": enable_id,
+            "timeout": time_out,
+        },
+        "problem_hash": problem_hash(problem),
+        "status": None,
+        "error": None,
+        "cost": None,
+        "stats": None,
+    }
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    solver = None
+    try:
+        solver = MatchingSolver(problem, heuristic_type, enable_matchingID=enable_id, heuristic_cache=heuristic_cache,
+                                budget=Budget(time_limit=time_out, enable_peak_memory=True))
+        # The solver stops itself at the deadline, func_timeout only catches the parts that don't check it
+        solution = func_timeout(time_out + 1, solver.solve)
+        record["status"] = STATUS_NAMES[solver.status]
+        if solution is not None:
+            record["cost"] = solution_cost(solution)
     except FunctionTimedOut:
-        sol = None
+        record["status"] = STATUS_NAMES[Status.Deadline]
+    except MemoryError:
+        record["status"] = STATUS_NAMES[Status.Memory]
     except Exception as e:
-        return None
-    return sol
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["wall_time"] = time.perf_counter() - start_wall
+    record["cpu_time"] = time.process_time() - start_cpu
+    # The peak of this problem, the worker process may have solved larger problems before
+    record["peak_rss"] = None if solver is None or solver.tracker is None else solver.tracker.sample_memory()
+    if solver is not None:
+        record["stats"] = solver.stats.to_dict()
+    print('.', end='', flush=True)
+    return record
+
+
+def problem_hash(problem: Problem) -> str:
+    """
+    Hashes a problem, so results of the same problem can be recognized.
+    :param problem: The problem
+    :return: The hash
+    """
+    # The map parsers create a WallGrid, whose rows are not lists
+    data = json.dumps([problem.width, problem.height, [list(row) for row in problem.grid],
+                       [(start.x, start.y, start.color) for start in problem.starts],
+                       [(goal.x, goal.y, goal.color) for goal in problem.goals]])
+    return hashlib.sha1(data.encode()).hexdigest()
 
 
-def solve(starting_problem: Problem, heuristic_type, enable_id, enable_sorting):
-    print()
-    problem = MatchingSolver(starting_problem, heuristic_type, enable_sorting=enable_sorting,
-                             enable_matchingID=enable_id)
-    solution = problem.solve()
-    if solution is None:
-        print("Failed to find solution")
-        return None
-    return solution
+def solution_cost(solution: Solution) -> int:
+    """
+    Calculates the sum of costs of a solution.
+    :param solution: The solution
+    :return: The cost
+    """
+    return sum(AgentPath(i, 0, [Coord(x, y) for x, y in path.route]).get_cost()
+               for i, path in enumerate(solution.paths))
 
 
 if __name__ == "__main__":
-    enable_id = True
-    enable_sorting = True
-    processes = 10
     map_root = "../../maps/progressive"
     result_root = "../../results"
-    queue = BenchmarkQueue("queue.txt")
-    runner = MapRunner(map_root, HeuristicType.Exhaustive)
-    runner.test_queue(120, queue, os.path.join(result_root, "test.txt"))
+    # Only runners on this host may share the queue, the database has to stay on a local filesystem
+    queue = BenchmarkQueue("queue.db")
+    runner = MapRunner(map_root, HeuristicType.Exhaustive, HeuristicCache("../../heuristic_cache"), processes=10,
+                       enable_id=True)
+    runner.test_queue(120, queue, os.path.join(result_root, "test.jsonl"))
@@ -9,8 +9,7 @@ from src.util.logger.logger import Logger
 
 def solve(starting_problem: Problem):
     print()
-    problem = MatchingSolver(starting_problem, heuristic_type, enable_sorting=enable_sorting,
-                             enable_matchingID=enable_id)
+    problem = MatchingSolver(starting_problem, heuristic_type, enable_matchingID=enable_id)
     solution = problem.solve(enable_cat=enable_cat)
     if solution is None:
         print("Failed to find solution")
@@ -27,9 +26,9 @@ def get_version() -> str:
 
 def get_name() -> str:
     if heuristic_type == HeuristicType.Exhaustive:
-        return f"A* + OD + ID with exhaustive matching ({int(enable_cat)}{int(enable_id)}{int(enable_sorting)})"
+        return f"A* + OD + ID with exhaustive matching ({int(enable_cat)}{int(enable_id)})"
     else:
-        return f"A* + OD + ID with heuristic matching ({int(enable_cat)}{int(enable_id)}{int(enable_sorting)})"
+        return f"A* + OD + ID with heuristic matching ({int(enable_cat)}{int(enable_id)})"
 
 
 def run_benchmark():
@@ -62,7 +61,6 @@ if __name__ == '__main__':
     heuristic_type = HeuristicType.Exhaustive
     enable_cat = True
     enable_id = True
-    enable_sorting = False
 
     # Configure benchmark
     progressive_descriptor = ProgressiveDescriptor(
@@ -1,23 +1,28 @@
-from typing import List
+from typing import Iterator, Optional
 
 from src.util.agent_path import AgentPath
-from src.util.coord import Coord
+from src.util.grid import Grid
 
 
 class CAT:
 
-    def __init__(self, agent_ids, w, h, active=True):
+    def __init__(self, grid: Optional[Grid], active=True):
         """
         Create a Collision Avoidance Table.
-        :param agent_ids: All possible agent_ids
-        :param w: The width
-        :param h: The height
+        Stores the number of agents at every cell and time step, as well as the agents that are parked on their final
+        cell once their path has ended.
+        :param grid: The grid, used for the cell indexes
         :param active: Can be used to disable the table and always return 0
         """
         self.active = active
-        self.agent_ids = agent_ids
-        self.cat = [[list() for _ in range(w)] for _ in range(h)]
-        self.length = dict()
+        self.grid = grid
+        self.size = 0 if grid is None else grid.w * grid.h
+        self.paths = dict()
+        self.cat = dict()
+        self.parked = dict()
+
+        # Combined hash of the stored paths, used to recognise tables with the same contents
+        self.digest = 0
 
     def remove_cat(self, path: AgentPath):
         """
@@ -28,8 +33,19 @@ class CAT:
             return
         if path is None:
             return
-        for i, coord in enumerate(path.coords):
-            self.cat[coord.y][coord.x].remove((path.agent_id, i))
+        cells = self.paths.pop(path.agent_id)
+        self.digest ^= hash((path.agent_id, cells))
+        for i, cell in enumerate(cells):
+            key = i * self.size + cell
+            count = self.cat[key] - 1
+            if count == 0:
+                del self.cat[key]
+            else:
+                self.cat[key] = count
+        parked = self.parked[cells[-1]]
+        parked.remove((len(cells), path.agent_id))
+        if len(parked) == 0:
+            del self.parked[cells[-1]]
 
     def add_cat(self, path: AgentPath):
         """
@@ -38,36 +54,58 @@ class CAT:
         """
         if not self.active:
             return
-        for i, coord in enumerate(path.coords):
-            self.cat[coord.y][coord.x].append((path.agent_id, i))
-        self.length[path.agent_id] = len(path)
+        cells = tuple(self.grid.get_cell(coord) for coord in path.coords)
+        self.paths[path.agent_id] = cells
+        self.digest ^= hash((path.agent_id, cells))
+        for i, cell in enumerate(cells):
+            key = i * self.size + cell
+            self.cat[key] = self.cat.get(key, 0) + 1
+        self.parked.setdefault(cells[-1], []).append((len(cells), path.agent_id))
 
-    def get_cat(self, ignored_paths: List[int], coord: Coord, time) -> int:
+    def get_cat(self, ignored_paths: Iterator[int], cell: int, time) -> int:
         """
-        Gets the number of collisions at the coordinates.
+        Gets the number of collisions at the cell.
         Ignores the ids in the ignored_paths
         :param ignored_paths: The ids to ignore
-        :param coord: The location to check for conflicts
+        :param cell: The cell index of the location to check for conflicts
         :param time: The time for which to check
         :return: The number of found conflicts
         """
-        collision = 0
-        if self.active:
-            for key, value in self.length.items():
-                if time > value:
-                    if (key, value) in self.cat[coord.y][coord.x]:
-                        collision += 1
-            for agent_id in self.agent_ids:
-                if agent_id in ignored_paths:
-                    continue
-                if (agent_id, time) in self.cat[coord.y][coord.x]:
+        if not self.active:
+            return 0
+        collision = self.cat.get(time * self.size + cell, 0)
+        if collision != 0:
+            for agent_id in ignored_paths:
+                cells = self.paths.get(agent_id)
+                if cells is not None and time < len(cells) and cells[time] == cell:
+                    collision -= 1
+        parked = self.parked.get(cell)
+        if parked is not None:
+            for start, agent_id in parked:
+                if start <= time and agent_id not in ignored_paths:
                     collision += 1
         return collision
 
+    def get_digest(self, ignored_paths: Iterator[int]) -> int:
+        """
+        Gets a hash of the contents of the table as seen by get_cat.
+        Tables that give the same number of collisions everywhere have the same digest.
+        :param ignored_paths: The ids to ignore
+        :return: The digest
+        """
+        if not self.active:
+            return 0
+        digest = self.digest
+        for agent_id in ignored_paths:
+            cells = self.paths.get(agent_id)
+            if cells is not None:
+                digest ^= hash((agent_id, cells))
+        return digest
+
     @staticmethod
     def empty():
         """
         Creates an inactive Collision Avoidance Table.
         :return: An inactive CAT
         """
-        return CAT([], 0, 0, active=False)
+        return CAT(None, active=False)
@@ -0,0 +1,170 @@
+from heapq import heappush, heappop
+from typing import List, Optional, Tuple, FrozenSet
+
+# Cost of a forbidden assignment, larger than the cost of any valid assignment
+FORBIDDEN = 1 << 40
+
+
+def hungarian(costs: List[List[int]]) -> Optional[List[int]]:
+    """
+    Solves the assignment problem with the Hungarian algorithm in O(n^2 m).
+    :param costs: The cost matrix with n rows and m >= n columns, forbidden entries have the FORBIDDEN cost
+    :return: The column assigned to each row with the lowest total cost, None if no valid assignment exists
+    """
+    n = len(costs)
+    m = len(costs[0]) if n > 0 else 0
+    if n > m:
+        return None
+
+    # Potentials and matching are 1-indexed, row 0 and column 0 are used as sentinels
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_v = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            row = costs[i0 - 1]
+            delta = float("inf")
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < min_v[j]:
+                        min_v[j] = cur
+                        way[j] = j0
+                    if min_v[j] < delta:
+                        delta = min_v[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0 != 0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    res = [0] * n
+    for j in range(1, m + 1):
+        if match[j] != 0:
+            res[match[j] - 1] = j - 1
+    if any(costs[i][j] >= FORBIDDEN for i, j in enumerate(res)):
+        return None
+    return res
+
+
+class KBestAssignments:
+
+    def __init__(self, costs: List[List[Optional[int]]], blocks: List[int]):
+        """
+        Enumerates the assignments of rows to distinct columns in non-decreasing order of cost,
+        using Murty's k-best assignment algorithm.
+        Rows are split in independent blocks that never share a column, such as the agents of a team which can only
+        be assigned goals of their own color. Splitting a solution then only needs to solve the block of the row.
+        :param costs: The cost of assigning each column to each row, None if it is not allowed
+        :param blocks: The block of each row
+        """
+        self.costs = costs
+        self.blocks = dict()
+        for row, block in enumerate(blocks):
+            self.blocks.setdefault(block, []).append(row)
+        self.block_rows = [self.blocks[block] for block in blocks]
+
+        # The columns that can be assigned to each block
+        self.block_columns = dict()
+        for block, rows in self.blocks.items():
+            self.block_columns[block] = [column for column in range(len(costs[rows[0]]))
+                                         if any(costs[row][column] is not None for row in rows)]
+        self.block_of = blocks
+        self.counter = 0
+        self.queue = []
+
+        # The number of subproblems that were dropped because their best assignment reached the maximum
+        self.pruned = 0
+
+        forced = tuple(False for _ in costs)
+        forbidden = tuple(frozenset() for _ in costs)
+        assignment = [0 for _ in costs]
+        for block, rows in self.blocks.items():
+            columns = self.solve_block(block, assignment, forced, forbidden)
+            if columns is None:
+                return
+            for row, column in zip(rows, columns):
+                assignment[row] = column
+        self.push(tuple(assignment), forced, forbidden)
+
+    def solve_block(self, block: int, assignment: List[int], forced: Tuple[bool, ...],
+                    forbidden: Tuple[FrozenSet[int], ...]) -> Optional[List[int]]:
+        """
+        Solves the assignment of a single block under the constraints of a subproblem.
+        :param block: The block to solve
+        :param assignment: The assignment the forced rows are taken from
+        :param forced: If the column of each row is fixed to that of the assignment
+        :param forbidden: The columns each row may not be assigned
+        :return: The column of each row of the block, None if no valid assignment exists
+        """
+        rows = self.blocks[block]
+        columns = self.block_columns[block]
+        taken = set(assignment[row] for row in rows if forced[row])
+        matrix = []
+        for row in rows:
+            costs = self.costs[row]
+            if forced[row]:
+                matrix.append([costs[column] if column == assignment[row] else FORBIDDEN for column in columns])
+            else:
+                matrix.append([FORBIDDEN if costs[column] is None or column in taken or column in forbidden[row]
+                               else costs[column] for column in columns])
+        res = hungarian(matrix)
+        if res is None:
+            return None
+        return [columns[j] for j in res]
+
+    def push(self, assignment: Tuple[int, ...], forced: Tuple[bool, ...], forbidden: Tuple[FrozenSet[int], ...]):
+        """
+        Adds the best assignment of a subproblem to the queue.
+        :param assignment: The assignment
+        :param forced: The forced rows of the subproblem
+        :param forbidden: The forbidden columns of the subproblem
+        """
+        cost = sum(self.costs[row][column] for row, column in enumerate(assignment))
+        heappush(self.queue, (cost, self.counter, assignment, forced, forbidden))
+        self.counter += 1
+
+    def next(self, maximum=float("inf")) -> Optional[Tuple[int, Tuple[int, ...]]]:
+        """
+        Gets the next assignment in non-decreasing order of cost.
+        :param maximum: Assignments with this cost or higher are not returned, once reached the enumeration stops
+        :return: The cost and the column of each row, None if there are no more assignments below the maximum
+        """
+        if len(self.queue) == 0 or self.queue[0][0] >= maximum:
+            self.pruned += len(self.queue)
+            self.queue = []
+            return None
+        cost, _, assignment, forced, forbidden = heappop(self.queue)
+
+        # Partition the remaining assignments of the subproblem on the free rows
+        new_forced = list(forced)
+        for row, column in enumerate(assignment):
+            if forced[row]:
+                continue
+            new_forbidden = forbidden[:row] + (forbidden[row] | {column},) + forbidden[row + 1:]
+            sub_forced = tuple(new_forced)
+            columns = self.solve_block(self.block_of[row], list(assignment), sub_forced, new_forbidden)
+            if columns is not None:
+                sub_assignment = list(assignment)
+                for sub_row, sub_column in zip(self.block_rows[row], columns):
+                    sub_assignment[sub_row] = sub_column
+                self.push(tuple(sub_assignment), sub_forced, new_forbidden)
+            new_forced[row] = True
+        return cost, assignment
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import time
+from enum import Enum
+from typing import Optional
+
+
+class Status(Enum):
+    Solved = 1
+    NoSolution = 2
+    Cancelled = 3
+    Deadline = 4
+    Expansions = 5
+    Frontier = 6
+    Memory = 7
+
+
+class Budget:
+
+    def __init__(self, time_limit: Optional[float] = None, max_expansions: Optional[int] = None,
+                 max_frontier: Optional[int] = None, max_memory: Optional[int] = None, enable_peak_memory=False):
+        """
+        Create the limits of a solve, the limits that are None are not checked.
+        A budget only describes the limits, start is used to create the tracker that checks them,
+        so the same budget can be used for every call.
+        :param time_limit: The maximum time in seconds
+        :param max_expansions: The maximum number of expanded nodes
+        :param max_frontier: The maximum number of nodes in the frontier of a search
+        :param max_memory: The maximum current resident memory of the process in bytes
+        :param enable_peak_memory: Keep track of the peak resident memory while the budget is checked,
+                which is always done when there is a memory limit
+        """
+        self.time_limit = time_limit
+        self.max_expansions = max_expansions
+        self.max_frontier = max_frontier
+        self.max_memory = max_memory
+        self.enable_peak_memory = enable_peak_memory or max_memory is not None
+
+    def start(self, parent: Optional[BudgetTracker] = None) -> BudgetTracker:
+        """
+        Starts tracking the budget, the time limit starts now.
+        :param parent: The tracker of the enclosing call, its limits are checked as well and the expansions are
+                counted towards it
+        :return: The tracker
+        """
+        return BudgetTracker(self, parent)
+
+
+class BudgetTracker:
+    __slots__ = ("budget", "parent", "deadline", "expansions", "peak_memory")
+
+    def __init__(self, budget: Budget, parent: Optional[BudgetTracker] = None):
+        """
+        Create a tracker that keeps the used part of a budget.
+        Use Budget.start instead.
+        :param budget: The budget
+        :param parent: The tracker of the enclosing call
+        """
+        self.budget = budget
+        self.parent = parent
+        self.deadline = None if budget.time_limit is None else time.monotonic() + budget.time_limit
+        self.expansions = 0
+        # The highest resident memory seen by check, only kept with enable_peak_memory
+        self.peak_memory = 0
+        if budget.enable_peak_memory:
+            self.sample_memory()
+
+    def expand(self, count: int):
+        """
+        Counts expanded nodes towards this tracker and those of the enclosing calls.
+        :param count: The number of expanded nodes
+        """
+        tracker = self
+        while tracker is not None:
+            tracker.expansions += count
+            tracker = tracker.parent
+
+    def check(self, frontier_size: int = 0) -> Optional[Status]:
+        """
+        Checks the limits of this tracker and those of the enclosing calls.
+        Cheap enough to call every few thousand expansions.
+        :param frontier_size: The number of nodes in the frontier of the current search
+        :return: The status of the first exceeded limit, None if all limits hold
+        """
+        now = None
+        memory = None
+        tracker = self
+        while tracker is not None:
+            budget = tracker.budget
+            if tracker.deadline is not None:
+                if now is None:
+                    now = time.monotonic()
+                if now >= tracker.deadline:
+                    return Status.Deadline
+            if budget.max_expansions is not None and tracker.expansions >= budget.max_expansions:
+                return Status.Expansions
+            if budget.max_frontier is not None and frontier_size > budget.max_frontier:
+                return Status.Frontier
+            if budget.enable_peak_memory:
+                if memory is None:
+                    memory = get_memory()
+                tracker.peak_memory = max(tracker.peak_memory, memory)
+                if budget.max_memory is not None and memory > budget.max_memory:
+                    return Status.Memory
+            tracker = tracker.parent
+        return None
+
+    def sample_memory(self) -> int:
+        """
+        Measures the resident memory of the process and keeps it if it is the highest so far.
+        :return: The peak resident memory seen by this tracker in bytes
+        """
+        self.peak_memory = max(self.peak_memory, get_memory())
+        return self.peak_memory
+
+
+def get_memory() -> int:
+    """
+    Gets the current resident memory of the process.
+    Unlike the peak of the process it goes down again once memory is freed,
+    so it describes the current solve when a process solves many problems.
+    :return: The memory in bytes
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Without /proc only the peak of the process is available, which is only on unix
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,124 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.util.agent_path import AgentPath
+from src.util.grid import Grid
+
+
+class ConflictIndex:
+
+    def __init__(self, grid: Grid, agent_ids: List[int]):
+        """
+        Create an index of the conflicts between paths, used by Independence Detection.
+        Paths are indexed on their cell and time, their moves and the cell they are parked on once their path has ended.
+        When a path is added only the paths sharing one of these are checked, and the conflicting pairs are kept
+        up to date when paths are added or removed.
+        The conflicts are the same as those found by AgentPath.conflicts.
+        :param grid: The grid, used for the cell indexes
+        :param agent_ids: The agents that can be added, conflicts are reported in this order
+        """
+        self.grid = grid
+        self.size = grid.w * grid.h
+        self.agent_ids = agent_ids
+        self.order = dict((agent_id, i) for i, agent_id in enumerate(agent_ids))
+        self.length = 0
+        self.paths: Dict[int, Tuple[int, ...]] = dict()
+        self.vertices: Dict[int, List[int]] = dict()
+        self.edges: Dict[int, List[int]] = dict()
+        self.parked: Dict[int, List[Tuple[int, int]]] = dict()
+        self.conflicts: Dict[int, Set[int]] = dict()
+
+    def add(self, path: AgentPath):
+        """
+        Adds the path to the index and finds the paths it conflicts with.
+        :param path: The path
+        """
+        agent_id = path.agent_id
+        cells = tuple(self.grid.get_cell(coord) for coord in path.coords)
+        self.paths[agent_id] = cells
+        size = self.size
+        found = set()
+        for t, cell in enumerate(cells):
+            key = t * size + cell
+            # There are no conflicts at the start
+            if t > 0:
+                found.update(self.vertices.get(key, ()))
+                for start, other in self.parked.get(cell, ()):
+                    if start <= t:
+                        found.add(other)
+                previous = cells[t - 1]
+                if previous != cell:
+                    # Swapping conflict with an agent doing the opposite move
+                    found.update(self.edges.get(key * size + previous, ()))
+                    self.edges.setdefault((t * size + previous) * size + cell, []).append(agent_id)
+            self.vertices.setdefault(key, []).append(agent_id)
+
+        # Agents passing the final cell after the path has ended
+        start = len(cells) - 1
+        last = cells[-1]
+        for t in range(max(start, 1), self.length):
+            found.update(self.vertices.get(t * size + last, ()))
+        self.parked.setdefault(last, []).append((start, agent_id))
+        self.length = max(self.length, len(cells))
+
+        found.discard(agent_id)
+        self.conflicts[agent_id] = found
+        for other in found:
+            self.conflicts[other].add(agent_id)
+
+    def remove(self, path: Optional[AgentPath]):
+        """
+        Removes the path from the index together with its conflicts.
+        :param path: The path
+        """
+        if path is None:
+            return
+        agent_id = path.agent_id
+        cells = self.paths.pop(agent_id)
+        size = self.size
+        for t, cell in enumerate(cells):
+            key = t * size + cell
+            self.remove_from(self.vertices, key, agent_id)
+            if t > 0 and cells[t - 1] != cell:
+                self.remove_from(self.edges, (t * size + cells[t - 1]) * size + cell, agent_id)
+        self.remove_from(self.parked, cells[-1], (len(cells) - 1, agent_id))
+        for other in self.conflicts.pop(agent_id):
+            self.conflicts[other].discard(agent_id)
+
+    @staticmethod
+    def remove_from(table: dict, key: int, value):
+        """
+        Removes a value from a list in the table, the list is removed once it is empty.
+        :param table: The table
+        :param key: The key of the list
+        :param value: The value to remove
+        """
+        values = table[key]
+        values.remove(value)
+        if len(values) == 0:
+            del table[key]
+
+    def find_conflict(self) -> Optional[Tuple[int, int]]:
+        """
+        Finds the first conflicting pair, in the order of the agent ids.
+        :return: The ids of the conflicting paths
+        """
+        for agent_id in self.agent_ids:
+            others = self.conflicts.get(agent_id)
+            if others:
+                index = self.order[agent_id]
+                later = [other for other in others if self.order[other] > index]
+                if len(later) > 0:
+                    return agent_id, min(later, key=self.order.get)
+        return None
+
+    def get_conflicts(self) -> List[Tuple[int, int]]:
+        """
+        Gets all conflicting pairs, in the order of the agent ids.
+        :return: The ids of the conflicting paths
+        """
+        res = []
+        for agent_id in self.agent_ids:
+            index = self.order[agent_id]
+            others = self.conflicts.get(agent_id, ())
+            res.extend((agent_id, other) for other in sorted(others, key=self.order.get) if self.order[other] > index)
+        return res
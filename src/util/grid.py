@@ -1,11 +1,13 @@
+from collections import OrderedDict
 from enum import Enum
-from queue import Queue
-from typing import List, Optional, Iterator
+from typing import List, Optional, Tuple, Callable, Union
 
+import numpy as np
 from mapfmclient import MarkedLocation
 
-from src.util.agent import Agent
 from src.util.coord import Coord
+from src.util.heuristic_cache import HeuristicCache
+from src.util.wall_grid import WallGrid
 
 
 class HeuristicType(Enum):
@@ -13,97 +15,245 @@ class HeuristicType(Enum):
     Exhaustive = 2
 
 
+# Distance of the cells that can't reach the goal
+UNREACHABLE = -1
+
+
+class LazyTables:
+
+    def __init__(self, compute: Callable[[int], list], size: int, capacity: int):
+        """
+        Gives access to tables that are only computed when they are first used.
+        The most recently used tables are kept, once there are more than the capacity the oldest is dropped.
+        :param compute: Computes the table of an index
+        :param size: The number of indexes
+        :param capacity: The maximum number of tables to keep
+        """
+        self.compute = compute
+        self.size = size
+        self.capacity = capacity
+        self.tables = OrderedDict()
+
+    def __getitem__(self, index: int) -> list:
+        table = self.tables.get(index)
+        if table is None:
+            if not 0 <= index < self.size:
+                raise IndexError(index)
+            table = self.compute(index)
+            self.tables[index] = table
+            if len(self.tables) > self.capacity:
+                self.tables.popitem(last=False)
+        else:
+            self.tables.move_to_end(index)
+        return table
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        # Tables loaded from the heuristic cache are views of memory-mapped files, which can't be pickled.
+        # They are loaded again when they are used.
+        state = self.__dict__.copy()
+        state["tables"] = OrderedDict()
+        return state
+
+
 class Grid:
 
-    def __init__(self, grid: List[List[int]], width: int, height: int, starts: List[MarkedLocation],
-                 goals: List[MarkedLocation], heuristic_type: HeuristicType):
+    def __init__(self, grid: Union[WallGrid, List[List[int]]], width: int, height: int, starts: List[MarkedLocation],
+                 goals: List[MarkedLocation], heuristic_type: HeuristicType,
+                 heuristic_cache: Optional[HeuristicCache] = None, capacity: int = 128):
         """
         Create a grid
-        :param grid: The actual grid: 1 for wall 0 for open
+        :param grid: The actual grid: 1 for wall 0 for open, used as is if the map parser already created the walls
         :param width: The width
         :param height: The height
         :param starts: The starting locations
         :param goals: The goal locations
         :param heuristic_type: The heuristic type
+        :param heuristic_cache: Optional on-disk cache of the distance tables
+        :param capacity: The maximum number of heuristic tables kept in memory
         """
-        self.grid = grid
+        self.walls = grid if isinstance(grid, WallGrid) else WallGrid.from_rows(grid, width, height)
+        # The padded buffer of the walls, indexed with (y + 1) * stride + x + 1
+        self.wall_data = self.walls.data
+        self.stride = self.walls.stride
         self.w = width
         self.h = height
         self.starts = starts
         self.goals = goals
+        self.successors = self.compute_successors()
+
+        # Bitmask of the goal colors for every cell
+        self.goal_colors = [0 for _ in range(width * height)]
+        for goal in goals:
+            self.goal_colors[self.get_cell(goal)] |= 1 << goal.color
+        self.heuristic_cache = heuristic_cache
+        self.digest = None
+        if heuristic_cache is not None:
+            self.digest = HeuristicCache.digest(self.get_walls())
+        self.capacity = capacity
+        self.sources = None
+        self.goal_sources = None
         self.heuristics = None
+        self.goal_heuristics = None
+        self.operators = None
         self.compute_heuristics(heuristic_type)
 
     def compute_heuristics(self, heuristic_type):
         """
-        Compute the heuristics based on the type
+        Prepare the heuristics based on the type.
+        The distance tables are computed when they are first used.
+        The distance tables of the separate goals are available for both types.
         :param heuristic_type: The heuristic type
         """
+        self.goal_sources = [[self.get_cell(goal)] for goal in self.goals]
         if heuristic_type == HeuristicType.Exhaustive:
-            self.heuristics = [self.compute_goal_heuristic(goal.x, goal.y) for goal in self.goals]
-        elif heuristic_type == HeuristicType.Heuristic:
+            self.sources = self.goal_sources
+        else:
             max_color = max(goal.color for goal in self.goals)
-            self.heuristics = [self.compute_color_heuristic(color) for color in range(max_color + 1)]
+            self.sources = [[self.get_cell(goal) for goal in self.goals if goal.color == color]
+                            for color in range(max_color + 1)]
+        self.heuristics = LazyTables(self.compute_heuristic, len(self.sources), self.capacity)
+        if heuristic_type == HeuristicType.Exhaustive:
+            self.goal_heuristics = self.heuristics
+        else:
+            self.goal_heuristics = LazyTables(self.compute_goal_heuristic, len(self.goal_sources), self.capacity)
+        self.operators = LazyTables(self.compute_operators, len(self.sources), self.capacity)
+
+    def compute_heuristic(self, index: int) -> Union[List[int], memoryview]:
+        """
+        Computes the distance table of a heuristic.
+        :param index: Either the color or the goal id, depending on heuristic type
+        :return: A distance table indexed by cell, UNREACHABLE for cells that can't reach the goal
+        """
+        return self.compute_table(self.sources[index])
+
+    def compute_goal_heuristic(self, index: int) -> Union[List[int], memoryview]:
+        """
+        Computes the distance table of a single goal.
+        :param index: The goal id
+        :return: A distance table indexed by cell, UNREACHABLE for cells that can't reach the goal
+        """
+        return self.compute_table(self.goal_sources[index])
 
-    def compute_goal_heuristic(self, x, y) -> List[List[Optional[int]]]:
+    def compute_table(self, cells: List[int]) -> Union[List[int], memoryview]:
         """
-        Compute the heuristics as the distance to the given coordinates
-        :param x: The x location
-        :param y: The y location
-        :return: A distance matrix to this location
+        Computes a distance table, or loads it from the heuristic cache if there is one.
+        Tables of the cache are used as a view of the memory-mapped file rather than copied, so all processes
+        solving the same map share their pages.
+        :param cells: The cells the distances are measured to
+        :return: A distance table indexed by cell, UNREACHABLE for cells that can't reach any of the cells
         """
-        queue = Queue()
-        queue.put((Coord(x, y), 0))
-        return self.compute_heuristic(queue)
+        if self.heuristic_cache is None:
+            return self.compute_distances([cells])[0].ravel().tolist()
+        path = self.heuristic_cache.get_path(self.digest, cells)
+        distances = self.heuristic_cache.load(path)
+        if distances is None:
+            computed = self.compute_distances([cells])[0]
+            self.heuristic_cache.store(path, computed)
+            # Opened from the file as well, unless it was evicted already
+            distances = self.heuristic_cache.load(path)
+            if distances is None:
+                return computed.ravel().tolist()
+        return memoryview(distances.ravel())
 
-    def compute_color_heuristic(self, color) -> List[List[Optional[int]]]:
+    def get_walls(self) -> np.ndarray:
         """
-        Compute a distance heuristic for the given color
-        :param color: The color
-        :return: A distance matrix to the nearest goal of the given color
+        Gets the walls as an array.
+        :return: The walls as an array of shape (h, w), 1 for wall 0 for open
         """
-        queue = Queue()
-        for goal in self.goals:
-            if goal.color == color:
-                queue.put((Coord(goal.x, goal.y), 0))
-        return self.compute_heuristic(queue)
+        return self.walls.to_array()
 
-    def compute_heuristic(self, queue) -> List[List[Optional[int]]]:
+    def compute_distances(self, sources: List[List[int]]) -> np.ndarray:
         """
-        Computes the heuristic by running a breath-first search with the starting locations in the queue
-        :param queue: The initial queue
-        :return: A distance matrix generated by a BFS
+        Computes the distance tables of all sets of starting cells at once with a vectorized breath-first search.
+        The frontiers of all tables are kept in a single array of flat indexes, every iteration expands all of them.
+        :param sources: The cells to start from for each table
+        :return: The distances as an array of shape (tables, h, w), UNREACHABLE for cells that can't be reached
         """
-        visited = set()
-        heuristic = [[None for _ in range(self.w)] for _ in range(self.h)]
-        while not queue.empty():
-            coord, dist = queue.get()
-            if coord in visited:
-                continue
-            visited.add(coord)
+        size = self.w * self.h
+        walkable = (self.get_walls() == 0).reshape(size)
+        indexes = np.arange(size, dtype=np.int64)
+        x = indexes % self.w
+        y = indexes // self.w
 
-            # Already has a better distance
-            if heuristic[coord.y][coord.x] is not None:
-                continue
-            heuristic[coord.y][coord.x] = dist
+        # The neighbours of each cell in the same directions as compute_successors, -1 if there is none
+        neighbors = np.full((size, 4), -1, dtype=np.int64)
+        for i, (on_grid, offset) in enumerate([(y < self.h - 1, self.w), (y > 0, -self.w),
+                                               (x < self.w - 1, 1), (x > 0, -1)]):
+            valid = on_grid & walkable
+            valid[valid] &= walkable[indexes[valid] + offset]
+            neighbors[valid, i] = indexes[valid] + offset
 
-            for neighbor in self.get_neighbors(coord):
-                if neighbor not in visited:
-                    queue.put((neighbor, dist + 1))
-        return heuristic
+        distances = np.full(len(sources) * size, UNREACHABLE, dtype=np.int32)
+        frontier = np.array(sorted(set(i * size + cell for i, cells in enumerate(sources) for cell in cells
+                                       if walkable[cell])), dtype=np.int64)
+        distances[frontier] = 0
 
-    def get_neighbors(self, coords: Coord) -> List[Coord]:
+        # Used to remove duplicates from the next frontier, the last position of each index wins
+        owner = np.empty(len(distances), dtype=np.int64)
+        distance = 0
+        while len(frontier) > 0:
+            distance += 1
+            tables, cells = np.divmod(frontier, size)
+            reached = neighbors[cells]
+            reached = (reached + (tables * size)[:, None])[reached >= 0]
+            reached = reached[distances[reached] == UNREACHABLE]
+            positions = np.arange(len(reached))
+            owner[reached] = positions
+            reached = reached[owner[reached] == positions]
+            distances[reached] = distance
+            frontier = reached
+        return distances.reshape((len(sources), self.h, self.w))
+
+    def compute_successors(self) -> List[Tuple[int, ...]]:
+        """
+        Computes the successor table, for every walkable cell the walkable neighbours followed by the cell itself.
+        Walls have no successors.
+        :return: The successors of each cell
+        """
+        successors = []
+        walls = self.wall_data
+        # The offsets of the neighbours in the walls and in the cells, towards y + 1, y - 1, x + 1 and x - 1
+        offsets = ((self.stride, self.w), (-self.stride, -self.w), (1, 1), (-1, -1))
+        for y in range(self.h):
+            index = (y + 1) * self.stride + 1
+            for cell in range(y * self.w, (y + 1) * self.w):
+                if walls[index] != 0:
+                    successors.append(())
+                else:
+                    successors.append(tuple(cell + offset for wall_offset, offset in offsets
+                                            if walls[index + wall_offset] == 0) + (cell,))
+                index += 1
+        return successors
+
+    def get_operators(self, index: int) -> List[Tuple[Tuple[int, int], ...]]:
+        """
+        Gets the operator table of a heuristic, computed on first use.
+        For every cell the moves to the neighbouring cells sorted on the change in cost + heuristic they cause,
+        this change is 1 + the difference in heuristic, excluding the accumulated cost of the agent.
+        The wait move is not part of the table as its change depends on the color of the agent.
+        :param index: Either the color or the goal id, depending on heuristic type
+        :return: The sorted (change, cell) pairs of each cell
         """
-        Gets the valid neighbours of the coordinates.
-        :param coords: The coordinates
-        :return: The neighbours
+        return self.operators[index]
+
+    def compute_operators(self, index: int) -> List[Tuple[Tuple[int, int], ...]]:
         """
-        res = list()
-        for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-            new_coord = coords.move(dx, dy)
-            if self.is_walkable(new_coord):
-                res.append(new_coord)
-        return res
+        Computes the operator table of a heuristic, as returned by get_operators.
+        :param index: Either the color or the goal id, depending on heuristic type
+        :return: The sorted (change, cell) pairs of each cell
+        """
+        table = self.heuristics[index]
+        operators = []
+        for cell, successors in enumerate(self.successors):
+            if table[cell] == UNREACHABLE:
+                operators.append(())
+            else:
+                operators.append(tuple(sorted((1 + table[successor] - table[cell], successor)
+                                              for successor in successors if successor != cell)))
+        return operators
 
     def get_heuristic(self, coord, index: int) -> Optional[int]:
         """
@@ -111,9 +261,26 @@ class Grid:
         Index depends on the heuristic type.
         :param coord: The location
         :param index: Either the color or the goal id, depending on heuristic type
-        :return: The heuristic
+        :return: The heuristic, None if the location can't reach the goal
         """
-        return self.heuristics[index][coord.y][coord.x]
+        distance = self.heuristics[index][self.get_cell(coord)]
+        return None if distance == UNREACHABLE else distance
+
+    def get_cell(self, coord) -> int:
+        """
+        Turns a location into its flat cell index.
+        :param coord: The location
+        :return: The cell index
+        """
+        return coord.y * self.w + coord.x
+
+    def get_coord(self, cell: int) -> Coord:
+        """
+        Turns a flat cell index back into a location.
+        :param cell: The cell index
+        :return: The location
+        """
+        return Coord(cell % self.w, cell // self.w)
 
     def is_walkable(self, coord) -> bool:
         """
@@ -129,23 +296,13 @@ class Grid:
         :param coord: The location
         :return: True if there is a wall
         """
-        return self.grid[coord.y][coord.x] == 1
-
-    def is_final(self, agents: Iterator[Agent]) -> bool:
-        """
-        Checks if all agents are on a valid goal.
-        :param agents: The agents
-        :return: True if all of them are on a valid goal
-        """
-        return all(self.on_goal(agent) for agent in agents)
+        return self.wall_data[(coord.y + 1) * self.stride + coord.x + 1] == 1
 
-    def on_goal(self, agent: Agent) -> bool:
+    def on_goal(self, cell: int, color: int) -> bool:
         """
-        Checks if the agent is on a valid goal
-        :param agent: The agent
+        Checks if an agent is on a valid goal
+        :param cell: The cell index of the agent
+        :param color: The color of the agent
         :return: True if it is on a valid goal
         """
-        for goal in self.goals:
-            if agent.color == goal.color and agent.coords.x == goal.x and agent.coords.y == goal.y:
-                return True
-        return False
+        return (self.goal_colors[cell] >> color) & 1 == 1
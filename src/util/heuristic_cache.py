@@ -0,0 +1,107 @@
+import hashlib
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class HeuristicCache:
+
+    def __init__(self, directory: str, max_size: int = 1 << 30):
+        """
+        Create a cache that stores distance tables on disk, so maps that are solved again don't need to recompute them.
+        Tables are stored as .npy files keyed by a hash of the walls and the cells the distances are measured to,
+        they are opened memory-mapped so all processes using the same map share the pages.
+        Once the files take more than the maximum size the least recently used ones are removed.
+        :param directory: The directory to store the tables in, created if it doesn't exist
+        :param max_size: The maximum total size of the stored tables in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        # The total size of the stored tables, only scanned again once it may exceed the maximum size.
+        # Other processes store tables as well, so it is only an estimate in between.
+        self.size = self.scan()[1]
+
+    @staticmethod
+    def digest(walls: np.ndarray) -> str:
+        """
+        Hashes the walls of a map.
+        :param walls: The walls as an array of shape (h, w)
+        :return: The hash
+        """
+        return hashlib.sha1(str(walls.shape).encode() + np.ascontiguousarray(walls, dtype=np.int8).tobytes()) \
+            .hexdigest()
+
+    def get_path(self, digest: str, cells: List[int]) -> str:
+        """
+        Gets the file of a table.
+        :param digest: The hash of the walls
+        :param cells: The cells the distances are measured to
+        :return: The path of the file
+        """
+        key = hashlib.sha1(",".join(map(str, sorted(cells))).encode()).hexdigest()[:20]
+        return os.path.join(self.directory, f"{digest[:20]}-{key}.npy")
+
+    def load(self, path: str) -> Optional[np.ndarray]:
+        """
+        Opens a stored table memory-mapped and marks it as recently used.
+        :param path: The path of the file
+        :return: The read-only table, None if it isn't stored
+        """
+        try:
+            table = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            # Removed by another process or not completely written
+            return None
+        return table
+
+    def store(self, path: str, table: np.ndarray):
+        """
+        Stores a table and evicts old tables when the cache is too large.
+        The file is written under a temporary name first, so other processes never see a partial table.
+        :param path: The path of the file
+        :param table: The table
+        """
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as f:
+            np.save(f, table)
+        os.replace(temporary, path)
+        self.size += os.path.getsize(path)
+        if self.size > self.max_size:
+            self.evict()
+
+    def scan(self) -> Tuple[List[Tuple[float, int, str]], int]:
+        """
+        Lists the stored tables.
+        :return: The modification time, size and path of each table, and their total size
+        """
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return files, total
+
+    def evict(self):
+        """
+        Removes the least recently used tables until the total size is below the maximum size.
+        """
+        files, total = self.scan()
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
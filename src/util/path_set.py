@@ -2,6 +2,7 @@ from typing import List, Optional, Iterator, Tuple
 
 from src.util.CAT import CAT
 from src.util.agent_path import AgentPath
+from src.util.conflict_index import ConflictIndex
 from src.util.coord import Coord
 from src.util.grid import Grid, HeuristicType
 
@@ -24,7 +25,8 @@ class PathSet:
             self.assigned_goals = assigned_goals
         self.paths: List[Optional[AgentPath]] = [None for _ in range(len(agent_ids))]
         self.costs: List[Optional[int]] = [None for _ in range(len(agent_ids))]
-        self.cat = CAT(agent_ids, grid.w, grid.h)
+        self.cat = CAT(grid)
+        self.conflicts = ConflictIndex(grid, agent_ids)
 
     def update(self, new_paths: Iterator[AgentPath]):
         """
@@ -35,8 +37,10 @@ class PathSet:
         for path in new_paths:
             i = self.mapping[path.agent_id]
             self.cat.remove_cat(self.paths[i])
+            self.conflicts.remove(self.paths[i])
             self.paths[i] = path
             self.cat.add_cat(path)
+            self.conflicts.add(path)
             self.costs[i] = path.get_cost()
 
     def get_remaining_cost(self, indexes: List[int], max_cost) -> int:
@@ -76,15 +80,7 @@ class PathSet:
         Find conflicting paths
         :return: ids of conflicting paths
         """
-        for i in range(len(self.agent_ids)):
-            id_i = self.agent_ids[i]
-            path_index_i = self.mapping[id_i]
-            for j in range(i + 1, len(self.agent_ids)):
-                id_j = self.agent_ids[j]
-                path_index_j = self.mapping[id_j]
-                if self.paths[path_index_i].conflicts(self.paths[path_index_j]):
-                    return id_i, id_j
-        return None
+        return self.conflicts.find_conflict()
 
     def __getitem__(self, agent_id):
         """
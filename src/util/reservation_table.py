@@ -0,0 +1,73 @@
+from typing import Dict, List, Set
+
+from src.util.agent_path import AgentPath
+from src.util.grid import Grid
+
+
+class ReservationTable:
+
+    def __init__(self, grid: Grid, paths: List[AgentPath]):
+        """
+        Create a space-time reservation table of predetermined paths, which other agents have to avoid.
+        The cells are reserved at every time step and the moves between time steps, to detect swapping conflicts.
+        Once a path has ended its agent stays on its final cell forever.
+        After the horizon, the time the last path ends, the reservations no longer change over time.
+        :param grid: The grid, used for the cell indexes
+        :param paths: The predetermined paths
+        """
+        self.size = grid.w * grid.h
+        self.horizon = 0
+        self.vertices: Set[int] = set()
+        self.edges: Set[int] = set()
+        self.parked: Dict[int, int] = dict()
+
+        # The last time step each cell is reserved, before it is parked on
+        self.last_visit: Dict[int, int] = dict()
+
+        size = self.size
+        for path in paths:
+            cells = [grid.get_cell(coord) for coord in path.coords]
+            for t, cell in enumerate(cells):
+                self.vertices.add(t * size + cell)
+                self.last_visit[cell] = max(self.last_visit.get(cell, 0), t)
+                if t > 0 and cells[t - 1] != cell:
+                    self.edges.add((t * size + cells[t - 1]) * size + cell)
+            end = len(cells) - 1
+            self.parked[cells[-1]] = min(self.parked.get(cells[-1], end), end)
+            self.horizon = max(self.horizon, end)
+
+    def is_free(self, time: int, cell: int, new_cell: int) -> bool:
+        """
+        Checks if an agent can move between two cells without conflicting with the reservations.
+        :param time: The time step the agent arrives in the new cell
+        :param cell: The cell the agent leaves
+        :param new_cell: The cell the agent moves to
+        :return: True if the move doesn't conflict
+        """
+        key = time * self.size + new_cell
+        if key in self.vertices:
+            return False
+        end = self.parked.get(new_cell)
+        if end is not None and end <= time:
+            return False
+        # Swapping conflict with a predetermined agent doing the opposite move
+        return cell == new_cell or (key * self.size + cell) not in self.edges
+
+    def is_done(self, time: int, cells) -> bool:
+        """
+        Checks if agents can stay on their cells forever from the given time step.
+        :param time: The time step
+        :param cells: The cells of the agents
+        :return: True if none of the cells is reserved after the time step
+        """
+        last_visit = self.last_visit
+        return all(last_visit.get(cell, -1) <= time for cell in cells)
+
+    def get_time(self, time: int) -> int:
+        """
+        Gets the time step that decides which moves are possible, as the reservations don't change after the horizon.
+        States at different time steps after the horizon can be treated as the same state.
+        :param time: The time step
+        :return: The time step, at most the horizon
+        """
+        return min(time, self.horizon)
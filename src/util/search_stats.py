@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Dict
+
+
+class SearchStats:
+    __slots__ = ("generated", "expanded", "duplicates", "pruned", "peak_frontier", "peak_closed", "searches",
+                 "cached", "merges", "replans", "largest_group", "matchings_tried", "matchings_pruned", "times")
+
+    def __init__(self):
+        """
+        Create the statistics of a search, all counters start at 0.
+        Solvers keep their statistics in a stats attribute and add those of the searches they run.
+        """
+        # A*+OD searches
+        self.generated = 0
+        self.expanded = 0
+        self.duplicates = 0
+        self.pruned = 0
+        self.peak_frontier = 0
+        self.peak_closed = 0
+        self.searches = 0
+        self.cached = 0
+
+        # Independence Detection
+        self.merges = 0
+        self.replans = 0
+        self.largest_group = 0
+
+        # Goal assignments of exhaustive matching
+        self.matchings_tried = 0
+        self.matchings_pruned = 0
+
+        # Wall time in seconds spent in each phase
+        self.times: Dict[str, float] = dict()
+
+    def add(self, other: SearchStats):
+        """
+        Adds the statistics of another search, the peaks are the maximum of both.
+        :param other: The statistics to add
+        """
+        self.generated += other.generated
+        self.expanded += other.expanded
+        self.duplicates += other.duplicates
+        self.pruned += other.pruned
+        self.peak_frontier = max(self.peak_frontier, other.peak_frontier)
+        self.peak_closed = max(self.peak_closed, other.peak_closed)
+        self.searches += other.searches
+        self.cached += other.cached
+        self.merges += other.merges
+        self.replans += other.replans
+        self.largest_group = max(self.largest_group, other.largest_group)
+        self.matchings_tried += other.matchings_tried
+        self.matchings_pruned += other.matchings_pruned
+        for phase, seconds in other.times.items():
+            self.add_time(phase, seconds)
+
+    def add_time(self, phase: str, seconds: float):
+        """
+        Adds time spent in a phase.
+        :param phase: The name of the phase
+        :param seconds: The time in seconds
+        """
+        self.times[phase] = self.times.get(phase, 0) + seconds
+
+    def to_dict(self) -> dict:
+        """
+        Converts the statistics to a dictionary, for example to store them with the results of a benchmark.
+        :return: The statistics by name
+        """
+        res = dict((name, getattr(self, name)) for name in self.__slots__ if name != "times")
+        res["times"] = dict(self.times)
+        return res
+
+    def __str__(self):
+        return ", ".join(f"{name}: {value}" for name, value in self.to_dict().items())
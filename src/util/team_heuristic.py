@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from src.util.assignments import hungarian, FORBIDDEN
+from src.util.grid import Grid, UNREACHABLE
+
+
+class TeamHeuristic:
+
+    def __init__(self, grid: Grid, capacity: int = 1 << 20):
+        """
+        Create a lower bound on the remaining cost of a team,
+        which takes into account that every agent needs its own goal.
+        The bound is the cost of the cheapest assignment of the agents to distinct goals of their color,
+        which is at least the sum of the distances to the nearest goals.
+        Bounds are memoized on the team and its positions, so they are shared by all states and searches using it.
+        Once there are more than the capacity the oldest bounds are dropped.
+        :param grid: The grid, its per goal distance tables are used
+        :param capacity: The maximum number of memoized bounds
+        """
+        self.grid = grid
+        self.goals: Dict[int, List[int]] = dict()
+        for i, goal in enumerate(grid.goals):
+            self.goals.setdefault(goal.color, []).append(i)
+        self.capacity = capacity
+        self.bounds: Dict[Tuple[int, Tuple[int, ...]], int] = OrderedDict()
+
+        # The distance tables of the goals of each color, kept here as the grid only keeps the recently used tables
+        # and a color can have more goals than that
+        self.tables: Dict[int, list] = dict()
+
+    def get(self, color: int, cells: Tuple[int, ...]) -> int:
+        """
+        Gets the lower bound of a team.
+        :param color: The color of the team
+        :param cells: The sorted cells of the agents of the team
+        :return: The lower bound
+        """
+        key = (color, cells)
+        bound = self.bounds.get(key)
+        if bound is None:
+            bound = self.compute(color, cells)
+            self.bounds[key] = bound
+            if len(self.bounds) > self.capacity:
+                self.bounds.popitem(last=False)
+        return bound
+
+    def compute(self, color: int, cells: Tuple[int, ...]) -> int:
+        """
+        Computes the lower bound of a team.
+        When the agents can't all reach a distinct goal the sum of the distances to the nearest goals is used,
+        an agent that can't reach any goal makes the bound FORBIDDEN as the team can't be solved.
+        :param color: The color of the team
+        :param cells: The cells of the agents of the team
+        :return: The lower bound
+        """
+        tables = self.tables.get(color)
+        if tables is None:
+            tables = [self.grid.goal_heuristics[goal] for goal in self.goals[color]]
+            self.tables[color] = tables
+        costs = [[FORBIDDEN if table[cell] == UNREACHABLE else table[cell] for table in tables] for cell in cells]
+        nearest = [min(range(len(row)), key=row.__getitem__) for row in costs]
+
+        # The nearest goals are already distinct, so they are the cheapest assignment
+        if len(set(nearest)) == len(nearest):
+            assignment = nearest
+        else:
+            assignment = hungarian(costs)
+            if assignment is None:
+                assignment = nearest
+        return sum(row[goal] for row, goal in zip(costs, assignment))
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from typing import Callable, Iterator, List
+
+import numpy as np
+
+
+class WallGrid:
+    __slots__ = ("width", "height", "stride", "data")
+
+    def __init__(self, width: int, height: int):
+        """
+        Create the walls of a map in a single flat buffer, surrounded by a border of walls.
+        The border makes the cells directly next to the map walls, so neighbours can be checked without bounds checks.
+        All cells of the map start open.
+        It can be used as the grid of a problem, indexing it gives the rows of the map.
+        :param width: The width of the map
+        :param height: The height of the map
+        """
+        self.width = width
+        self.height = height
+        self.stride = width + 2
+        self.data = bytearray(b"\x01" * (self.stride * (height + 2)))
+        for y in range(height):
+            start = self.get_index(0, y)
+            self.data[start:start + width] = bytes(width)
+
+    @staticmethod
+    def from_rows(rows: List[List[int]], width: int, height: int) -> WallGrid:
+        """
+        Create the walls from the rows of a grid.
+        Rows can be longer than the width, they are cut to the width.
+        :param rows: The rows: 1 for wall 0 for open
+        :param width: The width
+        :param height: The height
+        :return: The walls
+        """
+        walls = WallGrid(width, height)
+        for y in range(height):
+            walls.set_row(y, bytes(rows[y][:width]))
+        return walls
+
+    @staticmethod
+    def translation(is_wall: Callable[[str], bool]) -> bytes:
+        """
+        Creates the table used by read_row to turn the characters of a map file into walls.
+        :param is_wall: If a character is a wall
+        :return: The translation table
+        """
+        return bytes(int(is_wall(chr(i))) for i in range(256))
+
+    def read_row(self, y: int, line: str, translation: bytes):
+        """
+        Fills a row with a line of a map file.
+        Characters after the width, like the line ending, are ignored.
+        :param y: The row
+        :param line: The line
+        :param translation: The table created by translation
+        """
+        self.set_row(y, line[:self.width].encode("latin-1").translate(translation))
+
+    def set_row(self, y: int, row: bytes):
+        """
+        Sets the walls of a row.
+        :param y: The row
+        :param row: The width values of the row: 1 for wall 0 for open
+        """
+        assert len(row) == self.width
+        start = self.get_index(0, y)
+        self.data[start:start + self.width] = row
+
+    def get_index(self, x: int, y: int) -> int:
+        """
+        Gets the index of a location in the buffer.
+        Locations up to one cell outside of the map are part of the border.
+        :param x: The x coordinate
+        :param y: The y coordinate
+        :return: The index
+        """
+        return (y + 1) * self.stride + x + 1
+
+    def to_array(self) -> np.ndarray:
+        """
+        Gets the walls as an array.
+        :return: A copy of the walls as an array of shape (h, w), 1 for wall 0 for open
+        """
+        padded = np.frombuffer(self.data, dtype=np.int8).reshape((self.height + 2, self.stride))
+        return padded[1:-1, 1:-1].copy()
+
+    def __getitem__(self, y: int) -> memoryview:
+        if not 0 <= y < self.height:
+            raise IndexError(y)
+        start = self.get_index(0, y)
+        return memoryview(self.data)[start:start + self.width]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return (self[y] for y in range(self.height))
+
+    def __len__(self):
+        return self.height
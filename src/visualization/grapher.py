@@ -1,3 +1,4 @@
+import json
 import os
 import re
 from enum import Enum
@@ -94,9 +95,22 @@ class ResultLoader:
         self.aggregated_data = self.aggregate_data()
 
     def load_data(self, name):
+        """
+        Loads the results, both the "folder, file, seconds" lines and the JSON records written by the map runner.
+        The time of a JSON record is its CPU time, None if it wasn't solved.
+        :param name: The name of the result file
+        :return: The folder, file and time of each result
+        """
         with open(os.path.join(self.result_root, name)) as f:
             data = []
             for line in f.readlines():
+                if line.strip() == "":
+                    continue
+                if line.lstrip().startswith("{"):
+                    record = json.loads(line)
+                    time = record["cpu_time"] if record["status"] == "solved" else None
+                    data.append((record["folder"], record["file"], time))
+                    continue
                 split = line.split(",")
                 folder = split[0].strip()
                 name = split[1].strip()
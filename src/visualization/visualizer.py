@@ -11,7 +11,7 @@ matplotlib.use("TkAgg")
 
 def visualize(grid: Grid, solution: Solution):
     max_t = max(map(lambda x: len(x.route), solution.paths))
-    base = grid.grid
+    base = grid.get_walls().tolist()
 
     for goal in grid.goals:
         base[goal.y][goal.x] = goal.color + 2
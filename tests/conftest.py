@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules are imported both from the root of the repository and from src, as main.py does
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, "src")]
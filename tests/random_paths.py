@@ -0,0 +1,50 @@
+import random
+from typing import List
+
+from mapfmclient import MarkedLocation
+
+from src.util.agent_path import AgentPath
+from src.util.coord import Coord
+from src.util.grid import Grid, HeuristicType
+
+
+def open_grid(width: int, height: int) -> Grid:
+    """
+    Creates a grid without walls, with a single agent and goal.
+    :param width: The width
+    :param height: The height
+    :return: The grid
+    """
+    return Grid([[0] * width for _ in range(height)], width, height, [MarkedLocation(0, 0, 0)],
+                [MarkedLocation(0, width - 1, height - 1)], HeuristicType.Exhaustive)
+
+
+def random_path(rng: random.Random, grid: Grid, agent_id: int, max_length: int) -> AgentPath:
+    """
+    Creates a random walk over the grid, which waits about as often as it moves.
+    :param rng: The random generator
+    :param grid: The grid
+    :param agent_id: The id of the agent
+    :param max_length: The maximum number of coordinates
+    :return: The path
+    """
+    coord = Coord(rng.randrange(grid.w), rng.randrange(grid.h))
+    coords = [coord]
+    for _ in range(rng.randrange(max_length)):
+        dx, dy = rng.choice([(0, 0), (0, 0), (0, 0), (0, 1), (0, -1), (1, 0), (-1, 0)])
+        if grid.is_walkable(coord.move(dx, dy)):
+            coord = coord.move(dx, dy)
+        coords.append(coord)
+    return AgentPath(agent_id, 0, coords)
+
+
+def random_paths(rng: random.Random, grid: Grid, count: int, max_length: int) -> List[AgentPath]:
+    """
+    Creates random walks for the agents 0 up to the count.
+    :param rng: The random generator
+    :param grid: The grid
+    :param count: The number of paths
+    :param max_length: The maximum number of coordinates of each path
+    :return: The paths
+    """
+    return [random_path(rng, grid, agent_id, max_length) for agent_id in range(count)]
@@ -0,0 +1,79 @@
+import random
+from itertools import permutations
+
+from src.util.assignments import FORBIDDEN, KBestAssignments, hungarian
+
+
+def all_assignments(costs):
+    """
+    Enumerates every assignment of the rows to distinct allowed columns.
+    :param costs: The cost matrix, None for the entries that are not allowed
+    :return: The cost and the column of each row of every assignment
+    """
+    res = []
+    for columns in permutations(range(len(costs[0])), len(costs)):
+        if all(costs[row][column] is not None for row, column in enumerate(columns)):
+            res.append((sum(costs[row][column] for row, column in enumerate(columns)), columns))
+    return res
+
+
+def random_costs(rng, rows, columns, colors):
+    """
+    Creates a cost matrix where every row can only be assigned the columns of its own color.
+    :param rng: The random generator
+    :param rows: The number of rows
+    :param columns: The number of columns
+    :param colors: The number of colors
+    :return: The costs and the color of each row
+    """
+    column_colors = [rng.randrange(colors) for _ in range(columns)]
+    row_colors = [rng.randrange(colors) for _ in range(rows)]
+    costs = [[rng.randint(0, 9) if column_colors[column] == color else None for column in range(columns)]
+             for color in row_colors]
+    return costs, row_colors
+
+
+def test_hungarian_is_optimal():
+    rng = random.Random(10)
+    for _ in range(500):
+        rows = rng.randint(1, 5)
+        costs = [[FORBIDDEN if rng.random() < 0.3 else rng.randint(0, 20) for _ in range(rng.randint(rows, 6))]]
+        costs += [[FORBIDDEN if rng.random() < 0.3 else rng.randint(0, 20) for _ in costs[0]] for _ in range(rows - 1)]
+        valid = all_assignments([[None if cost == FORBIDDEN else cost for cost in row] for row in costs])
+        res = hungarian(costs)
+        if len(valid) == 0:
+            assert res is None
+        else:
+            assert len(set(res)) == rows
+            assert sum(costs[row][column] for row, column in enumerate(res)) == min(valid)[0]
+
+
+def test_enumerates_all_assignments_in_order():
+    rng = random.Random(11)
+    for _ in range(300):
+        rows = rng.randint(1, 5)
+        costs, colors = random_costs(rng, rows, rng.randint(rows, 6), rng.randint(1, 3))
+        assignments = KBestAssignments(costs, colors)
+        found = []
+        while True:
+            res = assignments.next()
+            if res is None:
+                break
+            found.append(res)
+        assert [cost for cost, _ in found] == sorted(cost for cost, _ in found)
+        assert sorted(found) == sorted(all_assignments(costs))
+
+
+def test_stops_at_maximum():
+    rng = random.Random(12)
+    for _ in range(300):
+        rows = rng.randint(1, 5)
+        costs, colors = random_costs(rng, rows, rng.randint(rows, 6), rng.randint(1, 3))
+        maximum = rng.randint(0, 30)
+        assignments = KBestAssignments(costs, colors)
+        found = []
+        res = assignments.next(maximum)
+        while res is not None:
+            found.append(res)
+            res = assignments.next(maximum)
+        assert sorted(found) == sorted(other for other in all_assignments(costs) if other[0] < maximum)
@@ -0,0 +1,27 @@
+from src.util.budget import Budget, Status, get_memory
+
+
+def test_expansions_count_towards_enclosing_budgets():
+    outer = Budget(max_expansions=100).start()
+    inner = Budget(max_expansions=1000).start(outer)
+    inner.expand(60)
+    assert inner.check() is None
+    inner.expand(40)
+    assert inner.check() == Status.Expansions
+    assert outer.check() == Status.Expansions
+
+
+def test_frontier_and_deadline():
+    tracker = Budget(time_limit=0, max_frontier=10).start()
+    assert tracker.check() == Status.Deadline
+    tracker = Budget(max_frontier=10).start()
+    assert tracker.check(10) is None
+    assert tracker.check(11) == Status.Frontier
+
+
+def test_memory():
+    assert get_memory() > 0
+    tracker = Budget(enable_peak_memory=True).start()
+    assert tracker.check() is None
+    assert tracker.peak_memory > 0
+    assert Budget(max_memory=1).start().check() == Status.Memory
@@ -0,0 +1,57 @@
+import random
+
+from random_paths import open_grid, random_paths
+from src.util.CAT import CAT
+
+
+def count_collisions(grid, paths, ignored, cell, time):
+    """
+    Counts the paths at a cell by going over all of them, agents stay on their final cell once their path has ended.
+    :param grid: The grid
+    :param paths: The paths in the table
+    :param ignored: The ids of the paths to ignore
+    :param cell: The cell index
+    :param time: The time step
+    :return: The number of paths at the cell
+    """
+    return sum(path.agent_id not in ignored and grid.get_cell(path[min(time, len(path) - 1)]) == cell
+               for path in paths)
+
+
+def test_matches_counted_collisions():
+    rng = random.Random(5)
+    for _ in range(200):
+        grid = open_grid(rng.randint(1, 4), rng.randint(1, 4))
+        paths = random_paths(rng, grid, rng.randint(1, 5), 10)
+        cat = CAT(grid)
+        for path in paths:
+            cat.add_cat(path)
+        removed = rng.sample(paths, rng.randint(0, len(paths) - 1))
+        for path in removed:
+            cat.remove_cat(path)
+        stored = [path for path in paths if path not in removed]
+        for _ in range(20):
+            ignored = [path.agent_id for path in rng.sample(paths, rng.randint(0, len(paths)))]
+            cell = rng.randrange(grid.w * grid.h)
+            time = rng.randint(0, 12)
+            assert cat.get_cat(ignored, cell, time) == count_collisions(grid, stored, ignored, cell, time)
+
+
+def test_digest_depends_on_contents():
+    rng = random.Random(6)
+    for _ in range(200):
+        grid = open_grid(rng.randint(1, 4), rng.randint(1, 4))
+        paths = random_paths(rng, grid, rng.randint(2, 5), 10)
+        first = CAT(grid)
+        second = CAT(grid)
+        for path in paths:
+            first.add_cat(path)
+        for path in reversed(paths):
+            second.add_cat(path)
+        assert first.get_digest([]) == second.get_digest([])
+
+        # Ignoring a path gives the same digest as leaving it out
+        third = CAT(grid)
+        for path in paths[1:]:
+            third.add_cat(path)
+        assert first.get_digest([paths[0].agent_id]) == third.get_digest([])
@@ -0,0 +1,43 @@
+import random
+
+from random_paths import open_grid, random_path, random_paths
+from src.util.conflict_index import ConflictIndex
+
+
+def pairwise_conflicts(paths):
+    """
+    Finds the conflicting pairs by checking every pair of paths.
+    :param paths: The paths, ordered by agent id
+    :return: The ids of the conflicting paths
+    """
+    return [(a.agent_id, b.agent_id) for i, a in enumerate(paths) for b in paths[i + 1:] if a.conflicts(b)]
+
+
+def test_matches_pairwise_conflicts():
+    rng = random.Random(8)
+    for _ in range(300):
+        grid = open_grid(rng.randint(1, 4), rng.randint(1, 4))
+        paths = random_paths(rng, grid, rng.randint(1, 6), 10)
+        index = ConflictIndex(grid, [path.agent_id for path in paths])
+        for path in rng.sample(paths, len(paths)):
+            index.add(path)
+        expected = pairwise_conflicts(paths)
+        assert index.get_conflicts() == expected
+        assert index.find_conflict() == (expected[0] if expected else None)
+
+
+def test_remove_and_replace_paths():
+    rng = random.Random(9)
+    for _ in range(300):
+        grid = open_grid(rng.randint(1, 4), rng.randint(1, 4))
+        paths = random_paths(rng, grid, rng.randint(2, 6), 10)
+        index = ConflictIndex(grid, [path.agent_id for path in paths])
+        for path in paths:
+            index.add(path)
+        # Replace paths the way Independence Detection does after solving a group
+        for _ in range(3):
+            agent_id = rng.randrange(len(paths))
+            index.remove(paths[agent_id])
+            paths[agent_id] = random_path(rng, grid, agent_id, 10)
+            index.add(paths[agent_id])
+            assert index.get_conflicts() == pairwise_conflicts(paths)
@@ -0,0 +1,34 @@
+import random
+from heapq import heappush, heappop
+
+from Astar_OD_ID.Astar_OD.Frontier import BucketFrontier, HeapFrontier
+from Astar_OD_ID.Astar_OD.ODSolver import Node
+from Astar_OD_ID.Astar_OD.ODState import ODState
+
+
+def get_key(node: Node):
+    """
+    Gets the order of a node in the frontier.
+    :param node: The node
+    :return: The cost + heuristic, conflicts and heuristic
+    """
+    return node.cost + node.heuristic, node.conflicts, node.heuristic
+
+
+def test_pops_the_best_node():
+    rng = random.Random(6)
+    for frontier_class in (HeapFrontier, BucketFrontier):
+        for _ in range(100):
+            frontier = frontier_class()
+            expected = []
+            for _ in range(200):
+                if rng.random() < 0.6 or len(expected) == 0:
+                    node = Node(0, ODState([0]), rng.randint(0, 10), rng.randint(0, 10), rng.randint(0, 3))
+                    frontier.push(node)
+                    heappush(expected, get_key(node))
+                else:
+                    assert get_key(frontier.pop()) == heappop(expected)
+                assert len(frontier) == len(expected)
+            while expected:
+                assert get_key(frontier.pop()) == heappop(expected)
+            assert not frontier
@@ -0,0 +1,55 @@
+from mapfmclient import MarkedLocation, Problem
+
+from Astar_OD_ID.MatchingSolver import MatchingSolver
+from src.util.agent_path import AgentPath
+from src.util.coord import Coord
+from src.util.grid import HeuristicType
+
+# Three teams of three agents, where matching ID combines the solutions of groups solved without each other
+GRID = [
+    "...#.....#",
+    "..........",
+    ".........#",
+    "........#.",
+    "...#....#.",
+    "...#.#....",
+    ".....#.#..",
+    ".#....#...",
+    ".#....#...",
+    "..........",
+]
+STARTS = [(7, 3, 0), (6, 2, 1), (2, 2, 2), (9, 9, 0), (7, 9, 1), (7, 2, 2), (5, 8, 0), (8, 1, 1), (9, 1, 2)]
+GOALS = [(7, 4, 0), (7, 7, 1), (2, 0, 2), (8, 9, 0), (5, 4, 1), (7, 0, 2), (4, 3, 0), (3, 8, 1), (1, 3, 2)]
+
+
+def create_problem() -> Problem:
+    """
+    Creates the problem from the map and the locations.
+    :return: The problem
+    """
+    grid = [[int(c == "#") for c in row] for row in GRID]
+    return Problem(grid, len(GRID[0]), len(GRID), [MarkedLocation(color, x, y) for x, y, color in STARTS],
+                   [MarkedLocation(color, x, y) for x, y, color in GOALS])
+
+
+def get_paths(solution):
+    """
+    Turns a solution back into paths.
+    :param solution: The solution
+    :return: The path of each agent
+    """
+    return [AgentPath(i, 0, [Coord(x, y) for x, y in path.route]) for i, path in enumerate(solution.paths)]
+
+
+def test_anytime_publishes_valid_solutions():
+    published = []
+    solver = MatchingSolver(create_problem(), HeuristicType.Exhaustive, enable_matchingID=True, enable_anytime=True,
+                            improved=lambda solution, lower_bound: published.append((solution, lower_bound)))
+    solution = solver.solve()
+    assert sum(path.get_cost() for path in get_paths(solution)) == 48
+
+    assert len(published) > 0
+    for solution, lower_bound in published:
+        paths = get_paths(solution)
+        assert not any(a.conflicts(b) for i, a in enumerate(paths) for b in paths[i + 1:])
+        assert lower_bound <= 48 <= sum(path.get_cost() for path in paths)
@@ -0,0 +1,33 @@
+import random
+
+from random_paths import open_grid, random_path, random_paths
+from src.util.reservation_table import ReservationTable
+
+
+def test_moves_match_path_conflicts():
+    rng = random.Random(23)
+    for _ in range(500):
+        grid = open_grid(rng.randint(1, 4), rng.randint(1, 4))
+        predetermined = random_paths(rng, grid, rng.randint(1, 4), 10)
+        table = ReservationTable(grid, predetermined)
+        path = random_path(rng, grid, len(predetermined), 12)
+        cells = [grid.get_cell(coord) for coord in path.coords]
+
+        # The path is free when all of its moves are and no predetermined agent passes its final cell afterwards
+        end = len(cells) - 1
+        free = all(table.is_free(t, cells[t - 1], cells[t]) for t in range(1, end + 1)) and \
+            table.is_done(end, cells[-1:])
+        assert free == (not any(path.conflicts(other) for other in predetermined))
+
+
+def test_reservations_are_constant_after_horizon():
+    rng = random.Random(24)
+    for _ in range(200):
+        grid = open_grid(rng.randint(1, 4), rng.randint(1, 4))
+        table = ReservationTable(grid, random_paths(rng, grid, rng.randint(1, 4), 10))
+        # States after the horizon share their time step, their moves are all checked one step after it
+        time = table.horizon + rng.randint(1, 5)
+        assert table.get_time(time) == table.horizon
+        for cell in range(grid.w * grid.h):
+            for new_cell in grid.successors[cell]:
+                assert table.is_free(time, cell, new_cell) == table.is_free(table.horizon + 1, cell, new_cell)
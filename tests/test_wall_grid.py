@@ -0,0 +1,28 @@
+import random
+
+import numpy as np
+
+from src.util.wall_grid import WallGrid
+
+
+def test_rows_and_border():
+    rng = random.Random(25)
+    for _ in range(100):
+        width = rng.randint(1, 8)
+        height = rng.randint(1, 8)
+        rows = [[int(rng.random() < 0.3) for _ in range(width)] for _ in range(height)]
+        walls = WallGrid.from_rows(rows, width, height)
+        assert [list(row) for row in walls] == rows
+        assert walls.to_array().tolist() == rows
+        for y in range(-1, height + 1):
+            for x in range(-1, width + 1):
+                on_grid = 0 <= x < width and 0 <= y < height
+                assert walls.data[walls.get_index(x, y)] == (rows[y][x] if on_grid else 1)
+
+
+def test_read_row():
+    walls = WallGrid(4, 2)
+    translation = WallGrid.translation(lambda c: c == "@")
+    walls.read_row(0, "..@.\n", translation)
+    walls.read_row(1, "@@..", translation)
+    assert np.array_equal(walls.to_array(), [[0, 0, 1, 0], [1, 1, 0, 0]])